@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import asyncio
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+# Turns a Gst.Bus into an asyncio event stream.
+#
+# The bus exposes a file descriptor that becomes readable whenever a message is
+# queued, so we register it with the event loop instead of polling the bus on a
+# fixed tick. Messages are delivered to the consumer as soon as they are posted,
+# and an idle pipeline causes no wakeups at all.
+#
+#   async for msg in AsyncBus(pipeline.get_bus(), Gst.MessageType.EOS | Gst.MessageType.ERROR):
+#       handle_message(data, msg)
+class AsyncBus:
+    def __init__(self, bus, message_types=Gst.MessageType.ANY, loop=None):
+        self.bus = bus
+        self.message_types = message_types
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.closed = False
+        # Number of times the event loop woke us up, exposed for benchmarking
+        self.wakeups = 0
+
+        # The fd is only valid while nobody else (e.g. add_signal_watch) drains the bus
+        self.fd = bus.get_pollfd().fd
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    # This function is called by the event loop when the bus fd becomes readable.
+    # Popping a message also consumes its wakeup token, so we drain everything
+    # that is queued right now.
+    def _on_readable(self):
+        self.wakeups += 1
+
+        while True:
+            msg = self.bus.pop_filtered(self.message_types)
+            if msg is None:
+                break
+            self.queue.put_nowait(msg)
+
+    # Wait for the next message on the bus. Returns None once the adapter is closed.
+    async def pop(self):
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+    # Wait for the first message matching the given types, dropping the others
+    async def wait_for(self, message_types):
+        while True:
+            msg = await self.pop()
+            if msg is None or msg.type & message_types:
+                return msg
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.loop.remove_reader(self.fd)
+        # Wake up any pending consumer
+        self.queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.pop()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
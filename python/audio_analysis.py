@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import gi
+import logging
+import numpy
+
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst
+
+from frame_source import iter_frames
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Streaming audio analysis on the basic-tutorial-3.py audio branch
+# (uridecodebin -> audioconvert -> audioresample), with the sink replaced by an
+# appsink running with sync=false.
+#
+# Every buffer is cut into fixed windows and processed as one 2-D NumPy array:
+# per-window RMS and peak, silence segments, and an integrated loudness estimate.
+# Samples that do not fill a whole window are carried over to the next buffer, and
+# the loudness gate is computed from a fixed-size histogram, so memory does not
+# grow with the length of the file.
+#
+# The loudness follows the ITU-R BS.1770 gating scheme (400 ms blocks with 75%
+# overlap, -70 LUFS absolute gate, -10 LU relative gate) but without the
+# K-weighting pre-filter, which cannot be vectorized without an IIR filter
+# implementation. Treat it as an estimate, not a compliant measurement.
+
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+HISTOGRAM_STEP = 0.1
+HISTOGRAM_BINS = int((10.0 - ABSOLUTE_GATE) / HISTOGRAM_STEP)
+
+# Loudness blocks are made of BLOCK_HOPS hops, independently of the analysis window
+BLOCK_HOP = 0.1
+BLOCK_HOPS = 4
+
+# Power floor so log10 never sees zero
+POWER_FLOOR = 1e-20
+
+class AudioAnalyzer:
+    def __init__(self, rate, channels, window=0.1, silence_threshold=-60.0, min_silence=0.5):
+        self.rate = rate
+        self.channels = channels
+        self.window_frames = max(1, int(rate * window))
+        self.silence_threshold = silence_threshold
+        self.min_silence = min_silence
+
+        # Samples left over from the previous buffer
+        self.leftover = numpy.empty((0, channels), dtype=numpy.float32)
+        self.windows = 0
+        self.frames = 0
+        self.peak = 0.0
+
+        # Sum over channels of the squared samples not yet making a whole hop, and
+        # the mean of that sum over the last three hops, to build 400 ms blocks out of
+        # 100 ms hops
+        self.hop_frames = max(1, int(round(rate * BLOCK_HOP)))
+        self.pending = numpy.empty(0)
+        self.history = numpy.empty(0)
+
+        # Loudness histogram: number of blocks and their summed power per bin
+        self.block_counts = numpy.zeros(HISTOGRAM_BINS, dtype=numpy.int64)
+        self.block_power = numpy.zeros(HISTOGRAM_BINS)
+
+        self.silence_start = None
+
+    def window_time(self, index):
+        return float(index * self.window_frames / self.rate)
+
+    # Feed an (n, channels) float array. Returns the list of events produced by the
+    # windows it completed.
+    def feed(self, samples):
+        events = []
+
+        # Complete the pending window with the head of this buffer (at most one window copied)
+        if len(self.leftover):
+            need = self.window_frames - len(self.leftover)
+            self.leftover = numpy.concatenate((self.leftover, samples[:need]))
+            samples = samples[need:]
+            if len(self.leftover) < self.window_frames:
+                return events
+            events += self.process(self.leftover.reshape(1, self.window_frames, self.channels))
+            self.leftover = self.leftover[:0]
+
+        # All whole windows of the buffer as a view, no copy
+        n_windows = len(samples) // self.window_frames
+        body = n_windows * self.window_frames
+        if n_windows:
+            events += self.process(samples[:body].reshape(n_windows, self.window_frames, self.channels))
+
+        # Copy the tail, the buffer is unmapped once we return
+        self.leftover = numpy.array(samples[body:], dtype=numpy.float32)
+
+        return events
+
+    def process(self, windows):
+        events = []
+        first = self.windows
+
+        squares = numpy.square(windows, dtype=numpy.float64).sum(axis=2)
+        power = squares.mean(axis=1)
+        peaks = numpy.abs(windows).max(axis=(1, 2))
+
+        rms_db = 10 * numpy.log10(numpy.maximum(power / self.channels, POWER_FLOOR))
+        peak_db = 20 * numpy.log10(numpy.maximum(peaks, POWER_FLOOR))
+        self.peak = max(self.peak, float(peaks.max()))
+        self.windows += len(windows)
+        self.frames += windows.shape[0] * windows.shape[1]
+
+        self.add_hops(squares.ravel())
+
+        for i in range(len(windows)):
+            events.append({
+                "type": "window",
+                "time": self.window_time(first + i),
+                "rms": float(rms_db[i]),
+                "peak": float(peak_db[i]),
+            })
+
+        # Silence segments: only look at the windows where the silent state flips
+        silent = rms_db < self.silence_threshold
+        was_silent = self.silence_start is not None
+        flips = numpy.flatnonzero(numpy.diff(numpy.concatenate(([was_silent], silent)).astype(numpy.int8)))
+        for i in flips:
+            if silent[i]:
+                self.silence_start = self.window_time(first + i)
+            else:
+                events += self.end_silence(self.window_time(first + i))
+
+        return events
+
+    # Cut the per-frame power into 100 ms hops. A partial hop is kept for the next
+    # call, and dropped at the end of the stream like an incomplete block.
+    def add_hops(self, frame_power):
+        frame_power = numpy.concatenate((self.pending, frame_power))
+        n_hops = len(frame_power) // self.hop_frames
+        body = n_hops * self.hop_frames
+        self.pending = frame_power[body:].copy()
+        if n_hops:
+            self.add_blocks(frame_power[:body].reshape(n_hops, self.hop_frames).mean(axis=1))
+
+    # Turn consecutive 100 ms hops into overlapping 400 ms blocks and record their
+    # loudness in the histogram
+    def add_blocks(self, power):
+        power = numpy.concatenate((self.history, power))
+        if len(power) >= BLOCK_HOPS:
+            kernel = numpy.ones(BLOCK_HOPS) / BLOCK_HOPS
+            blocks = numpy.convolve(power, kernel, mode="valid")
+            loudness = -0.691 + 10 * numpy.log10(numpy.maximum(blocks, POWER_FLOOR))
+
+            gated = loudness > ABSOLUTE_GATE
+            bins = numpy.clip(((loudness[gated] - ABSOLUTE_GATE) / HISTOGRAM_STEP).astype(numpy.int64),
+                              0, HISTOGRAM_BINS - 1)
+            numpy.add.at(self.block_counts, bins, 1)
+            numpy.add.at(self.block_power, bins, blocks[gated])
+
+        self.history = power[-(BLOCK_HOPS - 1):]
+
+    def end_silence(self, end):
+        events = []
+        if self.silence_start is not None and end - self.silence_start >= self.min_silence:
+            events.append({"type": "silence", "start": self.silence_start, "end": end})
+        self.silence_start = None
+        return events
+
+    def integrated_loudness(self):
+        total = self.block_counts.sum()
+        if not total:
+            return None
+
+        # Relative gate from the mean power of all blocks above the absolute gate
+        relative = -0.691 + 10 * numpy.log10(self.block_power.sum() / total) + RELATIVE_GATE
+        first_bin = max(0, int((relative - ABSOLUTE_GATE) / HISTOGRAM_STEP))
+
+        counts = self.block_counts[first_bin:].sum()
+        if not counts:
+            return None
+        return float(-0.691 + 10 * numpy.log10(self.block_power[first_bin:].sum() / counts))
+
+    # Flush the state at the end of the stream and return the final events
+    def finish(self):
+        events = []
+        if len(self.leftover):
+            # Analyze the partial window at the end like any other one
+            frames = len(self.leftover)
+            events += self.process(self.leftover.reshape(1, frames, self.channels))
+            self.leftover = self.leftover[:0]
+
+        duration = self.frames / self.rate
+        events += self.end_silence(duration)
+        events.append({
+            "type": "summary",
+            "duration": duration,
+            "peak": float(20 * numpy.log10(max(self.peak, POWER_FLOOR))),
+            "loudness": self.integrated_loudness(),
+        })
+        return events
+
+# Decode `uri` and yield analysis events as they are produced
+def analyze(uri, window=0.1, silence_threshold=-60.0, min_silence=0.5):
+    analyzer = None
+
+    for frame in iter_frames(uri, "audio", max_buffers=8):
+        if analyzer is None:
+            structure = frame.caps.get_structure(0)
+            ret, rate = structure.get_int("rate")
+            ret, channels = structure.get_int("channels")
+            analyzer = AudioAnalyzer(rate, channels, window, silence_threshold, min_silence)
+
+        yield from analyzer.feed(frame.array)
+
+    if analyzer is not None:
+        yield from analyzer.finish()
+
+# Runs a whole file in a worker process and returns its non-window events, or the
+# error that stopped it
+def analyze_worker(uri, window, silence_threshold, min_silence):
+    Gst.init(None)
+    start = time.perf_counter()
+    try:
+        events = [e for e in analyze(uri, window, silence_threshold, min_silence) if e["type"] != "window"]
+    except RuntimeError as err:
+        return uri, None, str(err)
+    if events:
+        events[-1]["elapsed"] = time.perf_counter() - start
+    return uri, events, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming RMS/peak/loudness/silence analysis")
+    parser.add_argument("uris", nargs="+", help="URIs to analyze")
+    parser.add_argument("--window", type=float, default=0.1, help="window length in seconds")
+    parser.add_argument("--silence-threshold", type=float, default=-60.0, help="silence threshold in dBFS")
+    parser.add_argument("--min-silence", type=float, default=0.5, help="minimum silence length in seconds")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="analyze files in parallel and print only silences and summaries")
+    args = parser.parse_args()
+
+    if args.jobs is None and len(args.uris) == 1:
+        # Single file: stream every event as JSON lines while decoding
+        Gst.init(sys.argv[:1])
+        for event in analyze(args.uris[0], args.window, args.silence_threshold, args.min_silence):
+            print(json.dumps(event), flush=True)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.jobs) as pool:
+        jobs = [(uri, args.window, args.silence_threshold, args.min_silence) for uri in args.uris]
+        for uri, events, error in pool.starmap(analyze_worker, jobs):
+            if error is not None:
+                logger.error("{0}: {1}".format(uri, error))
+                continue
+            if not events:
+                logger.error("{0}: no audio stream found".format(uri))
+                continue
+
+            for event in events:
+                event["uri"] = uri
+                print(json.dumps(event), flush=True)
+
+            summary = events[-1]
+            logger.info("{0}: realtime factor {1:.1f}x".format(uri, summary["duration"] / summary["elapsed"]))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 import sys
-import gi
+import argparse
 import logging
 
-gi.require_version("GLib", "2.0")
-gi.require_version("GObject", "2.0")
-gi.require_version("Gst", "1.0")
-
-from gi.repository import Gst, GLib, GObject
+import player_core
+from player_core import Gst
+from flight_recorder import FlightRecorder
+from thread_boundaries import STRATEGIES, QueueLimits, build_audio_chain
 
 logging.basicConfig(level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s")
 logger = logging.getLogger(__name__)
@@ -16,36 +15,45 @@ class CustomData:
     def __init__(self):
         self.pipeline = None
         self.source = None
-        self.convert = None
-        self.resample = None
+        self.entry = None
         self.sink = None
+        self.core = None
+        self.recorder = None
 
 def tutorial_main():
     data = CustomData()
 
     # Initialize GStreamer
-    Gst.init(sys.argv[1:])
+    player_core.init()
+
+    # Queues split convert, resample and sink over several streaming threads (see
+    # thread_boundaries.py). By default everything runs on the decoder's thread.
+    parser = argparse.ArgumentParser(description="Play the audio of a URI")
+    parser.add_argument("--queues", choices=list(STRATEGIES), default="none",
+                        help="boundaries to insert queues at")
+    parser.add_argument("--queue-buffers", type=int, default=8, help="queue max-size-buffers (0 = unlimited)")
+    args = parser.parse_args()
 
     # Create the elements
     data.source = Gst.ElementFactory.make("uridecodebin", "source")
-    data.convert = Gst.ElementFactory.make("audioconvert", "convert")
-    data.resample = Gst.ElementFactory.make("audioresample", "resample")
     data.sink = Gst.ElementFactory.make("autoaudiosink", "sink")
 
     # Create the empty pipeline
     data.pipeline = Gst.Pipeline.new("test-pipeline")
 
-    if not data.pipeline or not data.source or not data.convert or not data.resample or not data.sink:
+    if not data.pipeline or not data.source or not data.sink:
         logger.error("Not all elements could be created.")
         sys.exit(1)
 
-    # Build the pipeline
+    # Build the pipeline. The decoder's pad is linked to the entry of the chain
+    # once it appears.
     data.pipeline.add(data.source)
-    data.pipeline.add(data.convert)
-    data.pipeline.add(data.resample)
     data.pipeline.add(data.sink)
-    if not data.convert.link(data.sink):
-        logger.error("Elements could not be linked.")
+    try:
+        data.entry = build_audio_chain(data.pipeline, data.sink, STRATEGIES[args.queues],
+                                       QueueLimits(args.queue_buffers))
+    except RuntimeError as err:
+        logger.error(str(err))
         sys.exit(1)
 
     # Set the URI to play
@@ -54,52 +62,22 @@ def tutorial_main():
     # Connect to the pad-added signal
     data.source.connect("pad-added", pad_added_handler, data)
 
-    # Start playing
-    ret = data.pipeline.set_state(Gst.State.PLAYING)
-    if ret == Gst.StateChangeReturn.FAILURE:
-        logger.error("Unable to set the pipeline to the playing state.")
-        sys.exit(1)
+    # The core handles the bus, the state tracking and the main loop. It quits
+    # the loop on ERROR or EOS.
+    data.core = player_core.PlayerCore(pipeline=data.pipeline)
 
-    # Listen to the bus
-    bus = data.pipeline.get_bus()
-    terminate = False
-
-    while True:
-        msg = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE,
-                                     Gst.MessageType.STATE_CHANGED | Gst.MessageType.ERROR | Gst.MessageType.EOS)
-
-        # Parse message
-        if msg:
-            if msg.type == Gst.MessageType.ERROR:
-                err, debug_info = msg.parse_error()
-                logger.error("Error received from element {s}: {s}".format(
-                    msg.src.get_name(),
-                    err.message))
-                logger.error("Debugging information: {debug_info if debug_info else 'none'}")
-                terminate = True
-            elif msg.type == Gst.MessageType.EOS:
-                logger.info("End-Of-Stream reached.")
-                terminate = True
-            elif msg.type == Gst.MessageType.STATE_CHANGED:
-                # We are only interested in state-changed messages from the pipeline
-                if msg.src == data.pipeline:
-                    old_state, new_state, pending_state = msg.parse_state_changed()
-                    logger.info("Pipeline state changed from {0:s} to {1:s}".format(
-                        Gst.Element.state_get_name(old_state),
-                        Gst.Element.state_get_name(new_state)))
-            else:
-                # This should not happen as we only asked for ERRORs and EOS
-                logger.error("Unexpected message received.")
-                terminate = True
-
-        if terminate:
-            break
-
-    data.pipeline.set_state(Gst.State.NULL)
+    # Keep the bus history in the flight recorder. It is dumped on ERROR or on SIGUSR1.
+    data.recorder = FlightRecorder()
+    data.recorder.install_signal_handler()
+    data.core.connect("message", lambda core, msg: data.recorder.record(msg))
+
+    # Start playing, and listen to the bus until the end of the stream
+    if data.core.run() == Gst.StateChangeReturn.FAILURE:
+        sys.exit(1)
 
 # This function will be called by the pad-added signal
 def pad_added_handler(src, new_pad, data):
-    sink_pad = data.convert.get_static_pad("sink")
+    sink_pad = data.entry.get_static_pad("sink")
 
     logger.info("Received new pad '{0:s}' from '{1:s}'".format(
         new_pad.get_name(),
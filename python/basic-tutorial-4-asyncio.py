@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import sys
+import asyncio
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+from async_bus import AsyncBus
+from flight_recorder import FlightRecorder
+
+logging.basicConfig(level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+class CustomData:
+    def __init__(self):
+        self.playbin = None
+        self.playing = None
+        self.terminate = False
+        self.seek_enabled = False
+        self.seek_done = False
+        self.duration = Gst.CLOCK_TIME_NONE
+        self.recorder = None
+
+async def tutorial_main():
+    data = CustomData()
+    data.playing = asyncio.Event()
+
+    # Initialize GStreamer
+    Gst.init(sys.argv[1:])
+
+    # Create the elements
+    data.playbin = Gst.ElementFactory.make("playbin", "playbin")
+
+    if not data.playbin:
+        logger.error("Not all elements could be created.")
+        sys.exit(1)
+
+    # Set the URI to play
+    data.playbin.set_property("uri", "http://docs.gstreamer.com/media/sintel_trailer-480p.webm")
+
+    # Listen to the bus. Messages are handled as soon as they are posted instead of
+    # on the next 100 ms tick of a timed_pop_filtered loop.
+    bus = AsyncBus(data.playbin.get_bus(),
+                   Gst.MessageType.STATE_CHANGED | Gst.MessageType.ERROR | Gst.MessageType.EOS | Gst.MessageType.DURATION_CHANGED)
+
+    # Keep the bus history in the flight recorder. It is dumped on ERROR or on SIGUSR1.
+    data.recorder = FlightRecorder()
+    data.recorder.install_signal_handler()
+
+    # Start playing
+    ret = data.playbin.set_state(Gst.State.PLAYING)
+    if ret == Gst.StateChangeReturn.FAILURE:
+        logger.error("Unable to set the pipeline to the playing state.")
+        sys.exit(1)
+
+    # Position reporting runs on its own task, so it only ticks while we are playing
+    position_task = asyncio.create_task(report_position(data))
+
+    async for msg in bus:
+        handle_message(data, msg)
+        if data.terminate:
+            break
+
+    position_task.cancel()
+    bus.close()
+
+    # Free resources
+    data.playbin.set_state(Gst.State.NULL)
+
+# This coroutine prints the position every 100 ms while we are PLAYING, and sleeps
+# on an event (no wakeups at all) otherwise
+async def report_position(data):
+    while not data.terminate:
+        await data.playing.wait()
+        await asyncio.sleep(0.1)
+
+        if not data.playing.is_set():
+            continue
+
+        # Query the current position of the stream
+        ret, current = data.playbin.query_position(Gst.Format.TIME)
+        if not ret:
+            logger.error("Could not query current position.")
+            continue
+
+        # If we didn't know it yet, query the stream duration
+        if data.duration == Gst.CLOCK_TIME_NONE:
+            ret, data.duration = data.playbin.query_duration(Gst.Format.TIME)
+            if not ret:
+                logger.error("Could not query current duration.")
+
+        # print current position and total duration
+        logger.info("Position {0} / {1}".format(current, data.duration))
+
+        # If seeking is enabled, we have not done it yet, and the time is right, seek
+        if data.seek_enabled and not data.seek_done and current > 10 * Gst.SECOND:
+            data.playbin.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, 30 * Gst.SECOND)
+            data.seek_done = True
+
+def handle_message(data, msg):
+    data.recorder.record(msg)
+
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        logger.error("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+        data.terminate = True
+    elif msg.type == Gst.MessageType.EOS:
+        logger.info("End-Of-Stream reached.")
+        data.terminate = True
+    elif msg.type == Gst.MessageType.DURATION_CHANGED:
+        data.duration = Gst.CLOCK_TIME_NONE
+    elif msg.type == Gst.MessageType.STATE_CHANGED:
+        old_state, new_state, pending_state = msg.parse_state_changed()
+
+        if msg.src == data.playbin:
+            # Remember whether we are in the PLAYING state or not
+            if new_state == Gst.State.PLAYING:
+                data.playing.set()
+
+                # We just moved to PLAYING. Check if seeking is possible
+                query = Gst.Query.new_seeking(Gst.Format.TIME)
+                if data.playbin.query(query):
+                    fmt, data.seek_enabled, start, end = query.parse_seeking()
+
+                    if data.seek_enabled:
+                        logger.info("Seeking is ENABLED (from {0} to {1})".format(start, end))
+                    else:
+                        logger.info("Seeking is DISABLED for this stream")
+                else:
+                    logger.error("Seeking query failed.")
+            else:
+                data.playing.clear()
+    else:
+        # We should not reach here
+        logger.error("Unexpected message received.")
+
+if __name__ == "__main__":
+    asyncio.run(tutorial_main())
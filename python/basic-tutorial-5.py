@@ -1,53 +1,60 @@
 #!/usr/bin/env python3
 import sys
-import gi
 import logging
 
-gi.require_version("Gst", "1.0")
-gi.require_version('Gtk', '3.0')
-gi.require_version("GLib", "2.0")
-gi.require_version('GdkX11', '3.0')
-gi.require_version('GstVideo', '1.0')
-
-from gi.repository import Gst, Gtk, GLib, GdkX11, GstVideo
+import player_core
+from player_core import Gst, GLib
+from flight_recorder import FlightRecorder
+from keyframe_index import KeyframeIndex
+from position_tracker import PositionTracker
+from seek_scheduler import SeekScheduler
 
 logging.basicConfig(level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Loaded in tutorial_main, once we know there is a display to use
+Gtk = None
+
 class CustomData:
     def __init__(self):
+        self.core = None
         self.playbin = None
         self.sink_widget = None
         self.slider = None
         self.streams_list = None
         self.slider_update_signal_id = None
-        self.state = Gst.State.NULL
+        self.seeker = None
+        self.metadata = None
+        self.recorder = None
+        self.tracker = None
+        # Duration the slider range was last set to
         self.duration = Gst.CLOCK_TIME_NONE
 
 # This function is called when the PLAY button is clicked
 def play_cb(button, data):
-    data.playbin.set_state(Gst.State.PLAYING)
+    data.core.play()
 
 # This function is called when the PAUSE button is clicked
 def pause_cb(button, data):
-    data.playbin.set_state(Gst.State.PAUSED)
+    data.core.pause()
 
 # This function is called when the STOP button is clicked
 def stop_cb(button, data):
-    data.playbin.set_state(Gst.State.READY)
+    data.core.stop()
+    # After the state change, so nothing posted by a seek before it is acted on
+    data.seeker.reset()
 
 # This function is called when the main window is closed
 def delete_event_cb(widget, event, data):
     stop_cb(None, data)
     Gtk.main_quit()
 
-# This function is called when the slider changes its position. We perform a seek to the
-# new position here.
+# This function is called when the slider changes its position. We request a seek to the
+# new position here. While the slider is dragged, the scheduler keeps only one seek in
+# flight and coalesces the others into the latest target.
 def slider_cb(range, data):
     value = data.slider.get_value()
-    data.playbin.seek_simple(Gst.Format.TIME,
-                             Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT,
-                             value * Gst.SECOND)
+    data.seeker.request(int(value * Gst.SECOND))
 
 # This creates all the GTK+ widgets that compose our application, and registers the callbacks
 def create_ui(data):
@@ -93,70 +100,65 @@ def refresh_ui(data):
     current = -1
 
     # We do not want to update anything unless we are in the PAUSED or PLAYING states
-    if data.state < Gst.State.PAUSED:
+    if data.core.state < Gst.State.PAUSED:
         return True
 
-    # If we didn't know it yet, query the stream duration
-    if data.duration == Gst.CLOCK_TIME_NONE:
-        ret, data.duration = data.playbin.query_duration(Gst.Format.TIME)
-        if not ret:
-            logger.error("Could not query current duration.")
-        else:
-            # Set the range of the slider to the clip duration, in SECONDS
-            data.slider.set_range(0, data.duration / Gst.SECOND)
+    # Get the stream duration. The core only queries it until it is known, and
+    # again after a DURATION_CHANGED message.
+    duration = data.core.query_duration()
+    if duration == Gst.CLOCK_TIME_NONE:
+        # Normal until the stream is prerolled, and this runs 30 times per second
+        logger.debug("Could not query current duration.")
+    elif duration != data.duration:
+        # Set the range of the slider to the clip duration, in SECONDS
+        data.duration = duration
+        data.slider.set_range(0, data.duration / Gst.SECOND)
 
-    ret, current = data.playbin.query_position(Gst.Format.TIME)
-    if ret:
-        # Block the "value-changed" signal, so the slider_cb function is not called
-        # (which would trigger a seek the user has not requested)
-        data.slider.handler_block(data.slider_update_signal_id)
+    # The position is derived from the pipeline clock, no query is sent
+    current = data.tracker.position()
 
-        # Set the position of the slider to the current pipeline positoin, in SECONDS
-        data.slider.set_value(current / Gst.SECOND)
+    # Block the "value-changed" signal, so the slider_cb function is not called
+    # (which would trigger a seek the user has not requested)
+    data.slider.handler_block(data.slider_update_signal_id)
 
-        # Re-enable the signal
-        data.slider.handler_unblock(data.slider_update_signal_id)
+    # Set the position of the slider to the current pipeline positoin, in SECONDS
+    data.slider.set_value(current / Gst.SECOND)
+
+    # Re-enable the signal
+    data.slider.handler_unblock(data.slider_update_signal_id)
 
     return True
 
 # This function is called when new metadata is discovered in the stream
 def tags_cb(playbin, stream, data):
+    # The stream panel was already filled from the metadata cache
+    if data.metadata is not None:
+        return
+
     # We are possibly in a GStreamer working thread, so we notify the main
     # thread of this event through a message in the bus
     data.playbin.post_message(
         Gst.Message.new_application(
             data.playbin, Gst.Structure.new_empty("tags-changed")))
 
-# This function is called when an error message is posted on the bus
-def error_cb(bus, msg, data):
-    err, debug_info = msg.parse_error()
-    logger.error("Error received from element {s}: {s}".format(
-        msg.src.get_name(),
-        err.message))
-    logger.error("Debugging information: {debug_info if debug_info else 'none'}")
-
-    data.playbin.set_state(Gst.State.READY)
+# This function is called when an error message is posted on the bus. The core
+# has logged it already.
+def error_cb(core, msg, data):
+    data.core.stop()
+    data.seeker.reset()
 
 # This function is called when an End-Of-Stream message is posted on the bus.
 # We just set the pipeline to READY (which stops playback)
-def eos_cb(bus, msg, data):
-    logger.info("End-Of-Stream reached.")
-    data.playbin.set_state(Gst.State.READY)
+def eos_cb(core, msg, data):
+    data.core.stop()
 
-# This function is called when the pipeline changes states. We use it to
-# keep track of the current state.
-def state_changed_cb(bus, msg, data):
+# This function is called when the pipeline changes states. The core keeps
+# track of the current state.
+def state_changed_cb(core, msg, data):
     old_stated, new_state, pending_state = msg.parse_state_changed()
-    if msg.src == data.playbin:
-        data.state = new_state
-
-        logger.info("State changed from {0} to {1}".format(
-            Gst.Element.state_get_name(old_stated),
-            Gst.Element.state_get_name(new_state)))
-
-        if old_stated == Gst.State.READY and new_state == Gst.State.PAUSED:
-            # For extra responsiveness, we refresh the GUI as soon as we reach the PAUSED state
-            refresh_ui()
+    if old_stated == Gst.State.READY and new_state == Gst.State.PAUSED:
+        # For extra responsiveness, we refresh the GUI as soon as we reach the PAUSED state
+        refresh_ui(data)
 
 # Extract metadata from all the streams and write it to the text widget in the GUI
 def analyze_streams(data):
@@ -203,27 +205,56 @@ def analyze_streams(data):
             if ret:
                 buffer.insert_at_cursor("  language: {0}\n".format(str or "unknown"))
 
+# Write the stream metadata from the cache to the text widget in the GUI. This
+# is done once, instead of querying the tags of every stream on each change.
+def show_cached_streams(data):
+    buffer = data.streams_list.get_buffer()
+    buffer.set_text("")
+
+    counters = {}
+    for stream in data.metadata["streams"]:
+        kind = stream["type"]
+        if kind not in ("video", "audio", "subtitles"):
+            continue
+
+        i = counters.get(kind, 0)
+        counters[kind] = i + 1
+
+        buffer.insert_at_cursor("{0}{1} stream {2}\n".format(
+            "\n" if buffer.get_char_count() else "",
+            "subtitle" if kind == "subtitles" else kind,
+            i))
+        if kind != "subtitles":
+            buffer.insert_at_cursor("  codec: {0}\n".format(stream["codec"] or "unknown"))
+        if kind != "video" and stream["language"]:
+            buffer.insert_at_cursor("  language: {0}\n".format(stream["language"]))
+        if kind != "subtitles" and stream["bitrate"]:
+            buffer.insert_at_cursor("  bitrate: {0}\n".format(stream["bitrate"]))
+
 # This function is called when an "application" message is posted on the bus.
 # Here we retrieve the message posted by the tags_cb callback
-def application_cb(bus, msg, data):
+def application_cb(core, msg, data):
     if msg.get_structure().get_name() == "tags-changed":
         # If the message is the "tags-changed" (only one we are currently issuing), update
         # the stream info GUI
-        analyze_streams()
+        analyze_streams(data)
 
 def tutorial_main():
-    # Initialize GTK
-    Gtk.init(sys.argv)
+    global Gtk
+
+    # Load the GTK bindings and initialize GTK
+    Gtk = player_core.load_gui()
+    if Gtk is None:
+        logger.error("Unable to open a display.")
+        sys.exit(1)
 
     # Initialize GStreamer
-    Gst.init(sys.argv)
+    player_core.init()
 
     # Initialize our data structure
     data = CustomData()
 
     # Create the elements
-    data.playbin = Gst.ElementFactory.make("playbin", "playbin")
-
     videosink = Gst.ElementFactory.make("glsinkbin", "glsinkbin")
     gtkglsink = Gst.ElementFactory.make("gtkglsink", "gtkglsink")
 
@@ -244,16 +275,25 @@ def tutorial_main():
         videosink = Gst.ElementFactory.make("gtksink", "gtksink")
         data.sink_widget = videosink.get_property("widget")
 
-    if not data.playbin or not videosink:
+    if not videosink:
         logger.error("Not all elements could be created.")
         sys.exit(1)
 
-    # Set the URI to play
-    data.playbin.set_property("uri", "https://gstreamer.freedesktop.org/data/media/sintel_trailer-480p.webm")
+    # The URI to play
+    uri = "https://gstreamer.freedesktop.org/data/media/sintel_trailer-480p.webm"
+
+    # The core owns the playbin and its bus. The playbin assumes ownership of
+    # videosink, because that's still a floating reference.
+    try:
+        data.core = player_core.PlayerCore(uri, video_sink=videosink)
+    except RuntimeError as err:
+        logger.error(str(err))
+        sys.exit(1)
+    data.playbin = data.core.playbin
 
-    # Set the video-sink. The playbin assumes ownership of videosink, because
-    # that's still a floating reference.
-    data.playbin.set_property("video-sink", videosink)
+    # Seeks from the slider go through the scheduler. For local files indexed with
+    # keyframe_index.py, seeks land directly on known keyframes.
+    data.seeker = SeekScheduler(data.playbin, KeyframeIndex.load_uri(uri))
 
     # Connect to interesting signals in playbin
     data.playbin.connect("video-tags-changed", tags_cb, data)
@@ -263,28 +303,47 @@ def tutorial_main():
     # Create the GUI
     create_ui(data)
 
-    # Instruct the bus to emit signals for each received message, and connect to the interesting signals
-    bus = data.playbin.get_bus()
-    bus.add_signal_watch()
-    bus.connect("message::error", error_cb, data)
-    bus.connect("message::eos", eos_cb, data)
-    bus.connect("message::state-changed", state_changed_cb, data)
-    bus.connect("message::application", application_cb, data)
+    # If the file is in the metadata cache (see metadata_cache.py), show its streams
+    # right away and skip the per-change tag queries. Only local files are cached.
+    if uri.startswith("file://"):
+        from metadata_cache import MetadataCache
+        cache = MetadataCache()
+        data.metadata = cache.get_uri(uri)
+        cache.close()
+        if data.metadata is not None:
+            show_cached_streams(data)
+
+    # Every message goes to the flight recorder first, which is dumped on ERROR or on SIGUSR1
+    data.recorder = FlightRecorder()
+    data.recorder.install_signal_handler()
+    data.core.connect("message", lambda core, msg: data.recorder.record(msg))
+
+    # Keep the position tracker in sync with state changes, seeks and segments.
+    # "message" callbacks run before the others, so they see it up to date.
+    data.tracker = PositionTracker(data.playbin)
+    data.core.connect("message", lambda core, msg: data.tracker.handle(msg))
+
+    # Connect to the interesting messages
+    data.core.connect("error", lambda core, msg: error_cb(core, msg, data))
+    data.core.connect("eos", lambda core, msg: eos_cb(core, msg, data))
+    data.core.connect("state-changed", lambda core, msg: state_changed_cb(core, msg, data))
+    data.core.connect("application", lambda core, msg: application_cb(core, msg, data))
+    data.core.connect("async-done", lambda core, msg: data.seeker.async_done_cb(core, msg))
 
     # Start playing
-    ret = data.playbin.set_state(Gst.State.PLAYING)
+    ret = data.core.play()
     if ret == Gst.StateChangeReturn.FAILURE:
-        logger.error("Unable to set the pipeline to the playing state.")
         sys.exit(1)
 
-    # Register a function that GLib will call every second
-    GLib.timeout_add_seconds(1, refresh_ui)
+    # Register a function that GLib will call 30 times per second. Reading the
+    # tracked position is cheap enough for a smooth slider.
+    GLib.timeout_add(1000 // 30, refresh_ui, data)
 
     # Start the GTK main loop. We will not regain control until gtk_main_quit is called.
     Gtk.main()
 
-    # Free resourcesFree resources
-    data.playbin.set_state(Gst.State.NULL)
+    # Free resources
+    data.core.close()
 
 if __name__ == "__main__":
     tutorial_main()
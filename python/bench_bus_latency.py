@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst
+
+from async_bus import AsyncBus
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Compares the timed_pop_filtered polling loop of basic-tutorial-4.py with the
+# asyncio bus adapter.
+#
+# A helper thread posts application messages on an idle pipeline's bus at random
+# points in time and records when each one was posted. We measure how long it takes
+# until the message reaches the handler, and how many times each loop wakes up (and
+# how much CPU it burns) while the pipeline is idle.
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.sent = {}
+        self.latencies = []
+        self.wakeups = 0
+
+# Post `count` application messages, `interval` seconds apart
+def post_messages(data, count, interval):
+    for seq in range(count):
+        time.sleep(interval)
+        structure = Gst.Structure.new_from_string("bench, seq=(int){0}".format(seq))
+        data.sent[seq] = time.perf_counter()
+        data.pipeline.post_message(Gst.Message.new_application(data.pipeline, structure))
+
+    structure = Gst.Structure.new_from_string("bench-done")
+    data.pipeline.post_message(Gst.Message.new_application(data.pipeline, structure))
+
+# Returns True when the message terminates the run
+def handle_message(data, msg):
+    structure = msg.get_structure()
+    if structure.get_name() == "bench-done":
+        return True
+
+    ret, seq = structure.get_int("seq")
+    data.latencies.append(time.perf_counter() - data.sent[seq])
+    return False
+
+def run_poll(data, count, interval):
+    bus = data.pipeline.get_bus()
+    thread = threading.Thread(target=post_messages, args=(data, count, interval))
+    thread.start()
+
+    while True:
+        data.wakeups += 1
+        msg = bus.timed_pop_filtered(100 * Gst.MSECOND, Gst.MessageType.APPLICATION)
+        if msg and handle_message(data, msg):
+            break
+
+    thread.join()
+
+async def run_asyncio(data, count, interval):
+    bus = AsyncBus(data.pipeline.get_bus(), Gst.MessageType.APPLICATION)
+    thread = threading.Thread(target=post_messages, args=(data, count, interval))
+    thread.start()
+
+    async for msg in bus:
+        if handle_message(data, msg):
+            break
+
+    data.wakeups = bus.wakeups
+    bus.close()
+    thread.join()
+
+def run(mode, count, interval):
+    data = CustomData()
+    data.pipeline = Gst.Pipeline.new("bench-pipeline")
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    if mode == "poll":
+        run_poll(data, count, interval)
+    else:
+        asyncio.run(run_asyncio(data, count, interval))
+
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    data.pipeline.set_state(Gst.State.NULL)
+
+    latencies = sorted(data.latencies)
+    logger.info("{0:8s} latency median {1:8.3f} ms  p99 {2:8.3f} ms  max {3:8.3f} ms".format(
+        mode,
+        statistics.median(latencies) * 1000,
+        latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        latencies[-1] * 1000))
+    logger.info("{0:8s} wakeups {1} ({2:.1f}/s)  cpu {3:.3f} s over {4:.1f} s".format(
+        mode, data.wakeups, data.wakeups / wall, cpu, wall))
+
+def main():
+    parser = argparse.ArgumentParser(description="Bus message-to-handler latency benchmark")
+    parser.add_argument("--count", type=int, default=200, help="number of messages to post")
+    parser.add_argument("--interval", type=float, default=0.037,
+                        help="seconds between messages (not a multiple of the 100 ms poll tick)")
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds of idle bus to measure wakeups on")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+
+    logger.info("Busy bus: {0} messages every {1} s".format(args.count, args.interval))
+    for mode in ("poll", "asyncio"):
+        run(mode, args.count, args.interval)
+
+    # A single message after a long pause: the remaining wakeups are pure idle cost
+    logger.info("Idle bus: one message after {0} s".format(args.idle))
+    for mode in ("poll", "asyncio"):
+        run(mode, 1, args.idle)
+
+if __name__ == "__main__":
+    main()
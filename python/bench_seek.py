@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import statistics
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst
+
+from keyframe_index import KeyframeIndex
+from seek_scheduler import SeekScheduler
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Measures seek-to-first-frame latency on a local file, with and without the
+# keyframe index. A seek is done when the PAUSED pipeline posts ASYNC_DONE, that is
+# when the first frame after the seek has prerolled in the video sink.
+#
+# "cold" opens a fresh playbin for every seek, "warm" does all seeks on one playbin.
+
+def make_playbin(uri):
+    playbin = Gst.ElementFactory.make("playbin", "playbin")
+    playbin.set_property("uri", uri)
+    playbin.set_property("video-sink", Gst.ElementFactory.make("fakesink", "videosink"))
+    playbin.set_property("audio-sink", Gst.ElementFactory.make("fakesink", "audiosink"))
+    return playbin
+
+# Wait until the pipeline posts ASYNC_DONE, and forward it to the scheduler if any
+def wait_async_done(playbin, seeker=None):
+    bus = playbin.get_bus()
+    msg = bus.timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.ASYNC_DONE | Gst.MessageType.ERROR)
+    if msg is None:
+        raise RuntimeError("Timed out waiting for ASYNC_DONE.")
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    if seeker is not None:
+        seeker.async_done_cb(bus, msg)
+
+def open_paused(uri):
+    playbin = make_playbin(uri)
+    if playbin.set_state(Gst.State.PAUSED) == Gst.StateChangeReturn.FAILURE:
+        raise RuntimeError("Unable to set the pipeline to the paused state.")
+    wait_async_done(playbin)
+    return playbin
+
+def seek(playbin, index, target):
+    seeker = SeekScheduler(playbin, index)
+    seeker.request(target)
+    wait_async_done(playbin, seeker)
+    return seeker.last_latency
+
+def run_cold(uri, index, targets):
+    latencies = []
+    for target in targets:
+        playbin = open_paused(uri)
+        latencies.append(seek(playbin, index, target))
+        playbin.set_state(Gst.State.NULL)
+    return latencies
+
+def run_warm(uri, index, targets):
+    playbin = open_paused(uri)
+    latencies = [seek(playbin, index, target) for target in targets]
+    playbin.set_state(Gst.State.NULL)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Seek-to-first-frame latency with and without the keyframe index")
+    parser.add_argument("path", help="local media file")
+    parser.add_argument("--seeks", type=int, default=20, help="number of seek targets")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    uri = Gst.filename_to_uri(args.path)
+
+    playbin = open_paused(uri)
+    ret, duration = playbin.query_duration(Gst.Format.TIME)
+    playbin.set_state(Gst.State.NULL)
+    if not ret:
+        logger.error("Could not query duration.")
+        sys.exit(1)
+
+    index = KeyframeIndex.load_or_build(args.path)
+    logger.info("{0} keyframes in {1:.1f} s".format(len(index), duration / Gst.SECOND))
+
+    # Evenly spaced targets, visited in a shuffled but deterministic order
+    step = duration // (args.seeks + 1)
+    targets = [step * (1 + (i * 7) % args.seeks) for i in range(args.seeks)]
+
+    for name, run in (("cold", run_cold), ("warm", run_warm)):
+        for label, idx in (("no index", None), ("index", index)):
+            latencies = run(uri, idx, targets)
+            logger.info("{0:4s} {1:8s} median {2:7.2f} ms  max {3:7.2f} ms".format(
+                name, label, statistics.median(latencies) * 1000, max(latencies) * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import logging
+
+from bench_tutorials import generate_media
+from player_core import Gst
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Cold-start and time-to-first-buffer of a short headless job.
+#
+# Every run is a fresh interpreter, timed from the parent, so interpreter and GI
+# startup are included. Each child also reports when it finished importing,
+# initializing and when the first buffer reached a sink.
+#
+#   eager:          the basic-tutorial-5.py startup: Gst, Gtk, GdkX11 and GstVideo
+#                   imported up front and GTK initialized before GStreamer
+#   core:           player_core, headless, GUI bindings never loaded
+#   core-registry:  same, with the registry update check skipped
+
+EAGER = """
+import sys, time, json
+start = time.perf_counter()
+import gi
+gi.require_version("Gst", "1.0")
+gi.require_version("Gtk", "3.0")
+gi.require_version("GLib", "2.0")
+gi.require_version("GdkX11", "3.0")
+gi.require_version("GstVideo", "1.0")
+from gi.repository import Gst, Gtk, GLib, GdkX11, GstVideo
+imported = time.perf_counter()
+Gtk.init_check(sys.argv)
+Gst.init(None)
+initialized = time.perf_counter()
+first = []
+playbin = Gst.ElementFactory.make("playbin", "playbin")
+for prop in ("video-sink", "audio-sink"):
+    sink = Gst.ElementFactory.make("fakesink", None)
+    sink.set_property("sync", False)
+    sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER,
+        lambda pad, info: first.append(time.perf_counter()) or Gst.PadProbeReturn.REMOVE)
+    playbin.set_property(prop, sink)
+playbin.set_property("uri", sys.argv[1])
+playbin.set_state(Gst.State.PLAYING)
+while not first:
+    time.sleep(0.001)
+playbin.set_state(Gst.State.NULL)
+print(json.dumps({"import": imported - start, "init": initialized - start, "first_buffer": first[0] - start}))
+"""
+
+CORE = """
+import sys, time, json
+start = time.perf_counter()
+import player_core
+imported = time.perf_counter()
+player_core.init(update_registry={update_registry})
+initialized = time.perf_counter()
+core = player_core.PlayerCore(sys.argv[1], headless=True)
+core.play()
+while core.first_buffer_time is None:
+    time.sleep(0.001)
+first = core.started + core.first_buffer_time
+core.close()
+print(json.dumps({{"import": imported - start, "init": initialized - start, "first_buffer": first - start}}))
+"""
+
+VARIANTS = {
+    "eager": EAGER,
+    "core": CORE.format(update_registry=True),
+    "core-registry": CORE.format(update_registry=False),
+}
+
+def run_variant(code, uri):
+    env = dict(os.environ)
+    # A headless machine: no display for GTK to connect to
+    env.pop("DISPLAY", None)
+    env.pop("WAYLAND_DISPLAY", None)
+
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code, uri], env=env, check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    total = time.perf_counter() - start
+
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total"] = total
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start and time-to-first-buffer benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="runs per variant")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    uri = Gst.filename_to_uri(generate_media())
+
+    for name, code in VARIANTS.items():
+        results = [run_variant(code, uri) for i in range(args.runs)]
+        logger.info("{0:14s} import {1:6.1f} ms  init {2:6.1f} ms  first buffer {3:6.1f} ms  process {4:6.1f} ms".format(
+            name, *(statistics.median(r[key] for r in results) * 1000
+                    for key in ("import", "init", "first_buffer", "total"))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logger = logging.getLogger(__name__)
+
+# Headless benchmarks of the tutorial pipelines.
+#
+#   tutorial3: uridecodebin -> audioconvert -> audioresample -> fakesink
+#   tutorial4: playbin, seeking from 10 s to 30 s
+#   tutorial5: playbin with a custom video-sink
+#
+# All sinks are fakesink sync=false, and the input is generated locally with
+# audiotestsrc/videotestsrc, so the numbers only depend on this machine. Each case
+# runs in its own process so that peak RSS and CPU time are per case. Results are
+# written as JSON and compared against a stored baseline.
+
+MEDIA_SECONDS = 60
+MEDIA_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                         "gstreamer_examples", "bench-media")
+
+# Regression threshold, relative to the baseline
+TOLERANCE = 0.10
+
+# Metrics where a higher value is better; for all the others lower is better
+HIGHER_IS_BETTER = ("buffers_per_second", "realtime_factor")
+
+def media_path():
+    return os.path.join(MEDIA_DIR, "testsrc-{0}s.webm".format(MEDIA_SECONDS))
+
+# Encode test audio and video into a WebM file, unless it already exists
+def generate_media():
+    path = media_path()
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    logger.info("Generating {0}".format(path))
+
+    pipeline = Gst.parse_launch(
+        "webmmux name=mux ! filesink location={0}.tmp "
+        "videotestsrc num-buffers={1} ! video/x-raw,width=854,height=480,framerate=24/1 ! "
+        "vp8enc deadline=1 keyframe-max-dist=48 ! queue ! mux. "
+        "audiotestsrc num-buffers={2} samplesperbuffer=1024 ! audio/x-raw,rate=48000,channels=2 ! "
+        "vorbisenc ! queue ! mux.".format(
+            path, MEDIA_SECONDS * 24, MEDIA_SECONDS * 48000 // 1024))
+
+    pipeline.set_state(Gst.State.PLAYING)
+    msg = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    pipeline.set_state(Gst.State.NULL)
+
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Could not generate test media: {0}".format(err.message))
+
+    os.replace(path + ".tmp", path)
+    return path
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.convert = None
+        self.buffers = 0
+        self.seek_target = None
+        self.seek_seqnum = None
+        self.seek_issued = None
+        self.seek_latency = None
+        # Sink pads that received the segment of our seek
+        self.seeked_pads = set()
+
+def count_probe_cb(pad, info, data):
+    if info.type & Gst.PadProbeType.EVENT_DOWNSTREAM:
+        # The segment that starts the data after the seek carries its seqnum. With
+        # KEY_UNIT the first buffers may well be before the target.
+        event = info.get_event()
+        if event.type == Gst.EventType.SEGMENT and data.seek_seqnum is not None and event.get_seqnum() == data.seek_seqnum:
+            data.seeked_pads.add(pad)
+        return Gst.PadProbeReturn.OK
+
+    data.buffers += 1
+
+    # The first buffer after the seek's segment ends the seek measurement
+    if data.seek_latency is None and pad in data.seeked_pads:
+        data.seek_latency = time.perf_counter() - data.seek_issued
+
+    return Gst.PadProbeReturn.OK
+
+def make_fakesink(name, data):
+    sink = Gst.ElementFactory.make("fakesink", name)
+    sink.set_property("sync", False)
+    sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_DOWNSTREAM,
+                                          count_probe_cb, data)
+    return sink
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, data):
+    sink_pad = data.convert.get_static_pad("sink")
+    if sink_pad.is_linked():
+        return
+
+    if new_pad.get_current_caps().get_structure(0).get_name().startswith("audio/x-raw"):
+        new_pad.link(sink_pad)
+
+def build_tutorial3(uri, data):
+    data.pipeline = Gst.Pipeline.new("tutorial3")
+    source = Gst.ElementFactory.make("uridecodebin", "source")
+    data.convert = Gst.ElementFactory.make("audioconvert", "convert")
+    resample = Gst.ElementFactory.make("audioresample", "resample")
+    sink = make_fakesink("sink", data)
+
+    for element in (source, data.convert, resample, sink):
+        data.pipeline.add(element)
+    data.convert.link(resample)
+    resample.link(sink)
+
+    source.set_property("uri", uri)
+    source.connect("pad-added", pad_added_handler, data)
+
+def build_playbin(uri, data):
+    data.pipeline = Gst.ElementFactory.make("playbin", "playbin")
+    data.pipeline.set_property("uri", uri)
+    data.pipeline.set_property("audio-sink", make_fakesink("audiosink", data))
+
+def build_tutorial4(uri, data):
+    build_playbin(uri, data)
+    data.pipeline.set_property("video-sink", make_fakesink("videosink", data))
+    data.seek_target = 30 * Gst.SECOND
+
+def build_tutorial5(uri, data):
+    build_playbin(uri, data)
+
+    # A custom video-sink bin, the headless counterpart of glsinkbin + gtkglsink
+    videosink = Gst.Bin.new("videosink")
+    convert = Gst.ElementFactory.make("videoconvert", "convert")
+    sink = make_fakesink("sink", data)
+    videosink.add(convert)
+    videosink.add(sink)
+    convert.link(sink)
+    videosink.add_pad(Gst.GhostPad.new("sink", convert.get_static_pad("sink")))
+    data.pipeline.set_property("video-sink", videosink)
+
+CASES = {
+    "tutorial3": build_tutorial3,
+    "tutorial4": build_tutorial4,
+    "tutorial5": build_tutorial5,
+}
+
+def run_case(name, path):
+    Gst.init(None)
+    data = CustomData()
+    CASES[name](Gst.filename_to_uri(path), data)
+
+    bus = data.pipeline.get_bus()
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    time_to_playing = None
+
+    data.pipeline.set_state(Gst.State.PLAYING)
+
+    while True:
+        msg = bus.timed_pop_filtered(10 * Gst.MSECOND,
+                                     Gst.MessageType.STATE_CHANGED | Gst.MessageType.ERROR | Gst.MessageType.EOS)
+
+        # Seek from 10 s to 30 s, like basic-tutorial-4.py
+        if data.seek_target is not None and data.seek_issued is None and time_to_playing is not None:
+            ret, position = data.pipeline.query_position(Gst.Format.TIME)
+            if ret and position > 10 * Gst.SECOND:
+                event = Gst.Event.new_seek(1.0, Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT,
+                                           Gst.SeekType.SET, data.seek_target, Gst.SeekType.NONE, -1)
+                data.seek_seqnum = event.get_seqnum()
+                data.seek_issued = time.perf_counter()
+                data.pipeline.send_event(event)
+
+        if msg is None:
+            continue
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            data.pipeline.set_state(Gst.State.NULL)
+            raise RuntimeError("{0}: {1}".format(name, err.message))
+        if msg.type == Gst.MessageType.EOS:
+            break
+        if msg.src == data.pipeline and time_to_playing is None:
+            old_state, new_state, pending_state = msg.parse_state_changed()
+            if new_state == Gst.State.PLAYING:
+                time_to_playing = time.perf_counter() - start
+
+    elapsed = time.perf_counter() - start
+    ret, duration = data.pipeline.query_duration(Gst.Format.TIME)
+    data.pipeline.set_state(Gst.State.NULL)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    played = duration / Gst.SECOND if ret else MEDIA_SECONDS
+    if data.seek_issued is not None:
+        # The 10 s to 30 s range was skipped
+        played -= 20
+
+    result = {
+        "buffers_per_second": data.buffers / elapsed,
+        "realtime_factor": played / elapsed,
+        "time_to_playing": time_to_playing,
+        "cpu_time": (usage.ru_utime - cpu_start.ru_utime) + (usage.ru_stime - cpu_start.ru_stime),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+    }
+    if data.seek_target is not None:
+        result["seek_latency"] = data.seek_latency
+    return name, result
+
+# Returns a list of (case, metric, baseline, current, change) for the metrics that
+# got worse by more than TOLERANCE
+def compare(results, baseline):
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(case, {}).get(metric)
+            if not base or value is None:
+                continue
+
+            change = (value - base) / base
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > TOLERANCE:
+                regressions.append((case, metric, base, value, change))
+    return regressions
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the tutorial pipelines")
+    parser.add_argument("cases", nargs="*", default=sorted(CASES), help="cases to run")
+    parser.add_argument("-o", "--output", default="bench_output.json", help="where to write the results")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    path = generate_media()
+
+    # One fresh process per case, so RSS and CPU time are not shared between cases
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name in args.cases:
+        with context.Pool(1) as pool:
+            name, result = pool.apply(run_case, (name, path))
+        results[name] = result
+        logger.info("{0}: {1}".format(name, ", ".join(
+            "{0}={1:.3f}".format(k, v) for k, v in result.items() if v is not None)))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+
+        for case, metric, base, value, change in regressions:
+            logger.error("REGRESSION {0} {1}: {2:.3f} -> {3:.3f} ({4:+.1%})".format(case, metric, base, value, change))
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against {0}".format(args.baseline))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import logging
+
+import player_core
+from player_core import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Clip extraction without re-encoding.
+#
+# basic-tutorial-3.py and basic-tutorial-4.py decode everything they play. Cutting
+# a clip does not need that: the compressed streams are read with
+# urisourcebin -> parsebin (demuxer and parsers, no decoders) into appsinks, and
+# pushed into appsrc -> muxer -> filesink with their timestamps shifted to start at
+# zero.
+#
+# The demuxer knows where the keyframes are. A KEY_UNIT seek with SNAP_BEFORE makes
+# it start at the keyframe before the clip start, which is where a passthrough clip
+# has to begin. When frame accuracy is requested, the seek snaps to the keyframe
+# *after* the start instead, the frames between the start and that keyframe (the
+# partial GOP) are decoded and re-encoded in a second short pipeline, and the rest
+# of the clip is passed through. Frames at the end of the clip only reference
+# earlier frames for the codecs in ENCODERS, so the tail is cut by dropping the
+# frames past the end and needs no re-encode.
+#
+# A batch of clips runs in a pool of processes, one pipeline pair per clip.
+
+MUXERS = {
+    ".mkv": "matroskamux",
+    ".webm": "webmmux",
+    ".mp4": "mp4mux",
+    ".mov": "qtmux",
+    ".ts": "mpegtsmux",
+}
+
+# Encoders for the re-encoded head of frame-accurate clips, by compressed caps
+ENCODERS = {
+    "video/x-vp8": "vp8enc deadline=1 keyframe-max-dist=100000",
+    "video/x-vp9": "vp9enc deadline=1 keyframe-max-dist=100000",
+}
+
+class Stream:
+    def __init__(self, kind, index, caps, sink):
+        self.kind = kind
+        self.index = index
+        self.caps = caps
+        self.sink = sink
+
+    @property
+    def key(self):
+        return (self.kind, self.index)
+
+def wait_for(bus, types):
+    msg = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE, types | Gst.MessageType.ERROR)
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+    return msg
+
+# urisourcebin -> parsebin -> one appsink per audio/video stream. With `encoder`,
+# the video stream is decoded and encoded again before its appsink.
+class ClipSource:
+    def __init__(self, uri, encoder=None):
+        self.pipeline = Gst.Pipeline.new("clip-source")
+        self.source = Gst.ElementFactory.make("urisourcebin", "source")
+        self.parser = Gst.ElementFactory.make("parsebin", "parser")
+
+        if not self.source or not self.parser:
+            raise RuntimeError("Not all elements could be created.")
+
+        self.encoder = encoder
+        self.streams = []
+        self.counts = {}
+        # Called as on_sample(stream, sample) from the streaming threads
+        self.on_sample = None
+
+        self.source.set_property("uri", uri)
+        self.pipeline.add(self.source)
+        self.pipeline.add(self.parser)
+        self.source.connect("pad-added", self.source_pad_added_cb)
+        self.parser.connect("pad-added", self.pad_added_cb)
+
+    def source_pad_added_cb(self, src, new_pad):
+        sink_pad = self.parser.get_static_pad("sink")
+        if not sink_pad.is_linked():
+            new_pad.link(sink_pad)
+
+    def add(self, element):
+        self.pipeline.add(element)
+        element.sync_state_with_parent()
+        return element
+
+    # This function will be called by the pad-added signal of parsebin. Streams we
+    # do not cut (subtitles, data) still have to be linked.
+    def pad_added_cb(self, src, new_pad):
+        caps = new_pad.get_current_caps() or new_pad.query_caps(None)
+        name = caps.get_structure(0).get_name()
+        kind = name.split("/")[0]
+
+        if kind not in ("audio", "video"):
+            sink = self.add(Gst.ElementFactory.make("fakesink", None))
+            new_pad.link(sink.get_static_pad("sink"))
+            return
+
+        index = self.counts.get(kind, 0)
+        self.counts[kind] = index + 1
+
+        sink = Gst.ElementFactory.make("appsink", None)
+        sink.set_property("sync", False)
+        sink.set_property("emit-signals", True)
+        stream = Stream(kind, index, caps, sink)
+        sink.connect("new-sample", self.new_sample_cb, stream)
+        self.pipeline.add(sink)
+        sink.sync_state_with_parent()
+
+        if kind == "video" and self.encoder is not None:
+            decoder = self.add(Gst.ElementFactory.make("decodebin", None))
+            encode = self.add(Gst.parse_bin_from_description("videoconvert ! " + self.encoder, True))
+            encode.link(sink)
+            decoder.connect("pad-added", lambda decodebin, pad: pad.link(encode.get_static_pad("sink")))
+            new_pad.link(decoder.get_static_pad("sink"))
+        else:
+            new_pad.link(sink.get_static_pad("sink"))
+
+        self.streams.append(stream)
+
+    def new_sample_cb(self, sink, stream):
+        sample = sink.emit("pull-sample")
+        if sample is not None and self.on_sample is not None:
+            self.on_sample(stream, sample)
+        return Gst.FlowReturn.OK
+
+    def stream(self, kind):
+        return next((stream for stream in self.streams if stream.kind == kind), None)
+
+    def preroll(self):
+        self.pipeline.set_state(Gst.State.PAUSED)
+        wait_for(self.pipeline.get_bus(), Gst.MessageType.ASYNC_DONE)
+
+    def seek(self, start, stop, flags):
+        self.pipeline.seek(1.0, Gst.Format.TIME, Gst.SeekFlags.FLUSH | flags,
+                           Gst.SeekType.SET, start, Gst.SeekType.SET, stop)
+        wait_for(self.pipeline.get_bus(), Gst.MessageType.ASYNC_DONE)
+
+    # Play to the end of the seek segment
+    def run(self):
+        self.pipeline.set_state(Gst.State.PLAYING)
+        wait_for(self.pipeline.get_bus(), Gst.MessageType.EOS)
+
+    def close(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+# appsrc per stream -> muxer -> filesink
+class ClipWriter:
+    def __init__(self, path, streams):
+        muxer = MUXERS.get(os.path.splitext(path)[1].lower())
+        if muxer is None:
+            raise RuntimeError("No muxer for {0}".format(path))
+
+        self.pipeline = Gst.Pipeline.new("clip-writer")
+        self.mux = Gst.ElementFactory.make(muxer, "mux")
+        self.sink = Gst.ElementFactory.make("filesink", "sink")
+
+        if not self.mux or not self.sink:
+            raise RuntimeError("Not all elements could be created.")
+
+        self.sink.set_property("location", path)
+        self.pipeline.add(self.mux)
+        self.pipeline.add(self.sink)
+        self.mux.link(self.sink)
+
+        self.sources = {}
+        for stream in streams:
+            src = Gst.ElementFactory.make("appsrc", None)
+            src.set_property("caps", stream.caps)
+            src.set_property("format", Gst.Format.TIME)
+            src.set_property("block", True)
+            src.set_property("max-bytes", 16 * 1024 * 1024)
+            self.pipeline.add(src)
+            if not src.link(self.mux):
+                raise RuntimeError("{0} does not accept {1}".format(muxer, stream.caps.to_string()))
+            self.sources[stream.key] = src
+
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            raise RuntimeError("Unable to set the writer to the playing state.")
+
+    # Push `buffer` with its timestamps moved back by `origin`
+    def push(self, key, buffer, origin):
+        src = self.sources.get(key)
+        if src is None:
+            return
+
+        # A shallow copy: new metadata, same memory
+        buffer = buffer.copy()
+        if buffer.pts != Gst.CLOCK_TIME_NONE:
+            buffer.pts -= origin
+        if buffer.dts != Gst.CLOCK_TIME_NONE:
+            buffer.dts = max(buffer.dts - origin, 0)
+        src.emit("push-buffer", buffer)
+
+    def finish(self):
+        for src in self.sources.values():
+            src.emit("end-of-stream")
+        try:
+            wait_for(self.pipeline.get_bus(), Gst.MessageType.EOS)
+        finally:
+            self.close()
+
+    def close(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+# Decode and encode the partial GOP [start, cut) of `uri`, passing the audio
+# through. Returns the (key, buffer) pairs in timestamp order, or None if the
+# encoded video cannot continue the passed-through stream with `caps`.
+def encode_head(uri, encoder, start, cut, caps):
+    head = ClipSource(uri, encoder)
+    samples = []
+    head.on_sample = lambda stream, sample: samples.append((stream, sample))
+    try:
+        head.preroll()
+        head.seek(start, cut, Gst.SeekFlags.ACCURATE)
+        head.run()
+    finally:
+        head.close()
+
+    # The writer's appsrc has the caps of the body, the head has to fit them
+    encoded = next((sample.get_caps() for stream, sample in samples if stream.kind == "video"), None)
+    if encoded is None or not encoded.can_intersect(caps):
+        return None
+
+    # Interleave the streams, the muxer needs all of them to make progress
+    buffers = [(stream.key, sample.get_buffer()) for stream, sample in samples]
+    buffers.sort(key=lambda item: item[1].pts if item[1].pts != Gst.CLOCK_TIME_NONE else 0)
+    return buffers
+
+# Cut [start, end) of `uri` into `output`. Returns the actual clip start and the
+# length of the re-encoded head, in nanoseconds.
+def extract_clip(uri, start, end, output, accurate=False):
+    body = ClipSource(uri)
+    body.preroll()
+
+    preroll = None
+    video = body.stream("video")
+    if video is None:
+        # Audio only: every frame is a keyframe
+        body.seek(start, end, Gst.SeekFlags.ACCURATE)
+        cut = start
+    else:
+        snap = Gst.SeekFlags.SNAP_AFTER if accurate else Gst.SeekFlags.SNAP_BEFORE
+        body.seek(start, end, Gst.SeekFlags.KEY_UNIT | snap)
+        preroll = video.sink.emit("pull-preroll")
+        cut = preroll.get_buffer().pts if preroll is not None else start
+
+    head = None
+    if accurate and cut > start:
+        name = video.caps.get_structure(0).get_name()
+        encoder = ENCODERS.get(name)
+        if encoder is None:
+            logger.warning("Cannot re-encode {0}, cutting {1} on the keyframe before the start".format(name, output))
+        else:
+            head = encode_head(uri, encoder, start, min(cut, end), video.caps)
+            if head is None:
+                logger.warning("Re-encoded {0} does not match the stream, cutting {1} on the keyframe before the start".format(
+                    name, output))
+        if head is None:
+            body.seek(start, end, Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE)
+            preroll = video.sink.emit("pull-preroll")
+            cut = preroll.get_buffer().pts if preroll is not None else start
+            accurate = False
+
+    # Timestamps are moved back so the clip starts at zero. With B-frames the
+    # keyframe at the cut is decoded before it is shown and its DTS is before the
+    # cut, so PTS and DTS are both moved back by the earlier of the two: the DTS
+    # stay in order and the muxer keeps the offset of the first PTS. The encoders
+    # of the head do not reorder frames.
+    origin = start if accurate else cut
+    if head is None and preroll is not None and preroll.get_buffer().dts != Gst.CLOCK_TIME_NONE:
+        origin = min(origin, preroll.get_buffer().dts)
+
+    writer = ClipWriter(output, body.streams)
+
+    try:
+        if head is not None:
+            for key, buffer in head:
+                if buffer.pts == Gst.CLOCK_TIME_NONE or start <= buffer.pts < cut:
+                    writer.push(key, buffer, origin)
+
+        if cut < end:
+            def on_sample(stream, sample):
+                buffer = sample.get_buffer()
+                if buffer.pts != Gst.CLOCK_TIME_NONE:
+                    if buffer.pts < cut or (accurate and buffer.pts >= end):
+                        return
+                writer.push(stream.key, buffer, origin)
+
+            body.on_sample = on_sample
+            body.run()
+    except Exception:
+        writer.close()
+        raise
+    finally:
+        body.close()
+
+    writer.finish()
+    return cut, (cut - start if head is not None else 0)
+
+def extract_worker(uri, start, end, output, accurate):
+    player_core.init(update_registry=False)
+
+    begin = time.perf_counter()
+    cut, reencoded = extract_clip(uri, start, end, output, accurate)
+    return output, cut, reencoded, time.perf_counter() - begin
+
+# Extract a batch of (uri, start, end, output) clips in `processes` processes
+def extract_batch(clips, accurate=False, processes=None):
+    context = multiprocessing.get_context("spawn")
+    jobs = [(uri, start, end, output, accurate) for uri, start, end, output in clips]
+    with context.Pool(processes or min(len(jobs), os.cpu_count())) as pool:
+        return pool.starmap(extract_worker, jobs)
+
+# One clip per line: URI START END OUTPUT, times in seconds. Lines starting with #
+# are ignored.
+def read_clips(path):
+    clips = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            uri, start, end, output = line.split()
+            clips.append((uri, int(float(start) * Gst.SECOND), int(float(end) * Gst.SECOND), output))
+    return clips
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract clips by remuxing, without decoding")
+    parser.add_argument("clips", help="file with one 'URI START END OUTPUT' clip per line")
+    parser.add_argument("--accurate", action="store_true", help="re-encode the partial GOP at the start of each clip")
+    parser.add_argument("-j", "--processes", type=int, help="number of worker processes")
+    args = parser.parse_args()
+
+    player_core.init()
+    clips = read_clips(args.clips)
+    if not clips:
+        logger.error("No clips in {0}".format(args.clips))
+        sys.exit(1)
+
+    start = time.perf_counter()
+    for output, cut, reencoded, elapsed in extract_batch(clips, args.accurate, args.processes):
+        logger.info("{0}: starts at {1:.3f} s, {2:.3f} s re-encoded, {3:.2f} s".format(
+            output, cut / Gst.SECOND, reencoded / Gst.SECOND, elapsed))
+    logger.info("{0} clips in {1:.2f} s".format(len(clips), time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import array
+import struct
+import signal
+import argparse
+import threading
+import logging
+
+import player_core
+from player_core import Gst, GLib
+
+logger = logging.getLogger(__name__)
+
+# Low-overhead flight recorder for bus messages.
+#
+# Messages are stored in a fixed-size ring of preallocated columns (one array per
+# field), so recording a message is a handful of integer stores: message type,
+# source, monotonic time, message sequence number and, for state changes, the
+# old/new/pending states. Sources are interned once per object through a GObject
+# weak reference, so no reference to the element is kept, and their paths are
+# resolved when dumping; past max_sources further sources share one entry. Errors
+# and warnings are the only records that keep text, in a side table.
+#
+# Nothing is formatted while recording. The ring is dumped to a compact binary file
+# on ERROR, on a signal (SIGUSR1 by default) or on demand, and decoded afterwards
+# with `flight_recorder.py decode <file>`.
+
+MAGIC = b"GSTFR\x00\x01\x00"
+HEADER = struct.Struct("<8sIIII")
+
+class FlightRecorder:
+    def __init__(self, capacity=4096, dump_path=None, dump_on_error=True, max_sources=1024):
+        self.capacity = capacity
+        self.dump_path = dump_path or "flight-{0}.gstfr".format(os.getpid())
+        self.dump_on_error = dump_on_error
+        self.lock = threading.Lock()
+        self.count = 0
+        # Set by the signal handler, the dump itself is done outside of it
+        self.dump_requested = False
+
+        self.times = array.array("q", bytes(8 * capacity))
+        self.seqnums = array.array("I", bytes(4 * capacity))
+        self.types = array.array("I", bytes(4 * capacity))
+        self.sources = array.array("I", bytes(4 * capacity))
+        self.states = array.array("B", bytes(3 * capacity))
+
+        # Source id 0 is "no source", 1 is any source past max_sources. Sources are
+        # keyed by object address (the hash of a GObject), which is forgotten when
+        # the object is finalized so a new one at the same address is not mixed up.
+        self.max_sources = max_sources
+        self.source_ids = {}
+        self.source_refs = [None, None]
+        self.source_names = ["", "(other)"]
+        # Ring slot -> (sequence number, domain, code, message, debug) for errors and warnings
+        self.details = {}
+
+    def source_id(self, src):
+        if src is None:
+            return 0
+
+        key = hash(src)
+        source_id = self.source_ids.get(key)
+        if source_id is None:
+            if len(self.source_names) >= self.max_sources:
+                return 1
+            source_id = self.source_ids[key] = len(self.source_names)
+            # Once per source, and the name it is dumped with if it is gone by then
+            self.source_names.append(src.get_path_string())
+            self.source_refs.append(src.weak_ref(self.source_finalized_cb, key, source_id))
+        return source_id
+
+    # Called when a source is finalized, possibly on any thread and within dump(),
+    # so it does not take the lock
+    def source_finalized_cb(self, key, source_id):
+        if self.source_ids.get(key) == source_id:
+            del self.source_ids[key]
+
+    def record(self, msg):
+        msg_type = int(msg.type)
+
+        with self.lock:
+            slot = self.count % self.capacity
+            self.times[slot] = time.monotonic_ns()
+            self.seqnums[slot] = msg.get_seqnum()
+            self.types[slot] = msg_type
+            self.sources[slot] = self.source_id(msg.src)
+            self.details.pop(slot, None)
+
+            if msg_type == Gst.MessageType.STATE_CHANGED:
+                old_state, new_state, pending_state = msg.parse_state_changed()
+                self.states[3 * slot] = int(old_state)
+                self.states[3 * slot + 1] = int(new_state)
+                self.states[3 * slot + 2] = int(pending_state)
+            elif msg_type & (Gst.MessageType.ERROR | Gst.MessageType.WARNING):
+                err, debug_info = msg.parse_error() if msg_type == Gst.MessageType.ERROR else msg.parse_warning()
+                self.details[slot] = (self.count, err.domain, err.code, err.message, debug_info)
+
+            self.count += 1
+
+        if (msg_type == Gst.MessageType.ERROR and self.dump_on_error) or self.dump_requested:
+            self.dump()
+
+    # Bus "message" signal handler, for bus.connect("message", recorder.message_cb)
+    def message_cb(self, bus, msg):
+        self.record(msg)
+
+    # Write the recorded messages, oldest first, to `path`
+    def dump(self, path=None):
+        path = path or self.dump_path
+        self.dump_requested = False
+
+        with self.lock:
+            # Paths of the sources still alive, their parents may have changed
+            for source_id, ref in enumerate(self.source_refs):
+                src = ref() if ref is not None else None
+                if src is not None:
+                    self.source_names[source_id] = src.get_path_string()
+
+            count = min(self.count, self.capacity)
+            first = self.count - count
+            # Once the ring has wrapped, the oldest record is in the next slot to write
+            start = self.count % self.capacity if self.count > self.capacity else 0
+
+            columns = []
+            for column, width in ((self.times, 1), (self.seqnums, 1), (self.types, 1),
+                                  (self.sources, 1), (self.states, 3)):
+                used = column[:count * width]
+                columns.append(used[start * width:].tobytes() + used[:start * width].tobytes())
+
+            meta = json.dumps({
+                "sources": self.source_names,
+                "details": {str((seq - first)): [domain, code, message, debug]
+                            for slot, (seq, domain, code, message, debug) in self.details.items()
+                            if seq >= first},
+            }).encode("utf-8")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, count, first, self.capacity, len(meta)))
+            f.write(meta)
+            for column in columns:
+                f.write(column)
+        os.replace(tmp_path, path)
+
+        logger.info("Flight recorder dumped {0} messages to {1}".format(count, path))
+        return path
+
+    # Dump when the process receives `signum`. The handler may interrupt record()
+    # with the lock held, so it only requests the dump: it is done by the GLib main
+    # loop, or by the next record() for applications running another loop.
+    def install_signal_handler(self, signum=signal.SIGUSR1):
+        def handler(signum, frame):
+            self.dump_requested = True
+            GLib.idle_add(self.dump_idle_cb)
+        signal.signal(signum, handler)
+
+    def dump_idle_cb(self):
+        if self.dump_requested:
+            self.dump()
+        return False
+
+# Read a dump back. Returns a list of dicts, oldest first.
+def decode(path):
+    with open(path, "rb") as f:
+        magic, count, first, capacity, meta_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{0} is not a flight recorder dump".format(path))
+
+        meta = json.loads(f.read(meta_size).decode("utf-8"))
+        columns = []
+        for typecode, width in (("q", 1), ("I", 1), ("I", 1), ("I", 1), ("B", 3)):
+            column = array.array(typecode)
+            column.fromfile(f, count * width)
+            columns.append(column)
+
+    times, seqnums, types, sources, states = columns
+    records = []
+    for i in range(count):
+        msg_type = Gst.MessageType(types[i])
+        record = {
+            "seq": first + i,
+            "time": times[i],
+            "seqnum": seqnums[i],
+            "type": Gst.message_type_get_name(msg_type),
+            "source": meta["sources"][sources[i]],
+        }
+        if msg_type == Gst.MessageType.STATE_CHANGED:
+            record["states"] = [Gst.Element.state_get_name(Gst.State(s)) for s in states[3 * i:3 * i + 3]]
+        detail = meta["details"].get(str(i))
+        if detail is not None:
+            record["domain"], record["code"], record["message"], record["debug"] = detail
+        records.append(record)
+
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a bus-message flight recorder dump")
+    parser.add_argument("command", choices=("decode",))
+    parser.add_argument("path", help="dump file")
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+
+    player_core.init()
+    records = decode(args.path)
+    if not records:
+        return
+
+    origin = records[0]["time"]
+    for record in records:
+        if args.json:
+            print(json.dumps(record))
+            continue
+
+        line = "{0:8d} {1:+12.3f} ms  {2:16s} {3:24s}".format(
+            record["seq"], (record["time"] - origin) / 1e6, record["type"], record["source"])
+        if "states" in record:
+            line += " {0} -> {1} (pending {2})".format(*record["states"])
+        if "message" in record:
+            line += " {0} ({1})".format(record["message"], record["debug"] or "no debug info")
+        print(line)
+
+if __name__ == "__main__":
+    main()
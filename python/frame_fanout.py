@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+import os
+import time
+import mmap
+import fcntl
+import struct
+import argparse
+import multiprocessing
+import logging
+import numpy
+
+import player_core
+from player_core import Gst
+from frame_source import Frame, iter_frames
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Decode once, read from many processes.
+#
+# Every analysis process running its own copy of the basic-tutorial-3.py /
+# frame_source.py decode chain pays the decode again. Here a single publisher
+# decodes with frame_source.iter_frames and copies each frame once into a ring of
+# slots in a memory-mapped file under /dev/shm. Consumer processes map the same
+# file and get NumPy views straight into the slots, with the timestamps and caps
+# of every frame, without any copy.
+#
+# shmsink/shmsrc would carry the bytes but neither the caps nor the timestamps,
+# and a client that does not release its buffers stalls shmsink for everybody.
+# The ring keeps per-consumer state instead:
+#
+#   header | shape | caps | consumer table | slot 0 | slot 1 | ...
+#
+# Each slot starts with a sequence number that is odd while the publisher writes
+# it, so a reader can tell a complete frame from an overwritten one. Consumers
+# attach and detach at any time by claiming an entry of the consumer table (under
+# flock), where they publish their read cursor and policy:
+#
+#   drop:  never holds the publisher back. A consumer that falls more than the
+#          ring size behind skips ahead, and counts the frames it lost. The
+#          publisher can overwrite the slot of a frame the consumer still holds:
+#          a zero-copy consumer checks FanoutReader.intact() after using a frame,
+#          or the reader copies every frame out of the ring (copy=True).
+#   block: the publisher waits for it before overwriting a slot it has not read,
+#          but at most block_timeout seconds per frame, so a stuck or slow
+#          consumer cannot stall the others for long. Dead consumers are removed.
+
+MAGIC = b"GSTFAN\x00\x01"
+HEADER = struct.Struct("<8sIIIIQ")
+SHAPE = struct.Struct("<16sIIII")
+CAPS_SIZE = 4096
+CONSUMER = struct.Struct("<IIQQ")
+SLOT = struct.Struct("<QQQQ")
+
+PUBLISHED_OFFSET = 24
+CLOSED_OFFSET = 20
+SHAPE_OFFSET = HEADER.size
+CAPS_OFFSET = SHAPE_OFFSET + SHAPE.size
+CONSUMERS_OFFSET = CAPS_OFFSET + CAPS_SIZE
+
+POLICIES = {"drop": 0, "block": 1}
+
+def shm_path(name):
+    return os.path.join("/dev/shm", "gst-fanout-{0}".format(name))
+
+def align(size, alignment=64):
+    return (size + alignment - 1) // alignment * alignment
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Ring:
+    def __init__(self, mm, slots, slot_size, max_consumers):
+        self.mm = mm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_consumers = max_consumers
+        self.slots_offset = align(CONSUMERS_OFFSET + CONSUMER.size * max_consumers)
+        self.slot_stride = align(SLOT.size + slot_size)
+
+    @staticmethod
+    def file_size(slots, slot_size, max_consumers):
+        return align(CONSUMERS_OFFSET + CONSUMER.size * max_consumers) + slots * align(SLOT.size + slot_size)
+
+    def slot_offset(self, seq):
+        return self.slots_offset + (seq % self.slots) * self.slot_stride
+
+    def consumer_offset(self, index):
+        return CONSUMERS_OFFSET + index * CONSUMER.size
+
+    def published(self):
+        return struct.unpack_from("<Q", self.mm, PUBLISHED_OFFSET)[0]
+
+    def closed(self):
+        return struct.unpack_from("<I", self.mm, CLOSED_OFFSET)[0] != 0
+
+    def slot_seq(self, seq):
+        return struct.unpack_from("<Q", self.mm, self.slot_offset(seq))[0]
+
+class FanoutPublisher:
+    def __init__(self, name, slots=8, max_consumers=16, block_timeout=1.0, headroom=1.0, poll_interval=0.0005):
+        self.path = shm_path(name)
+        self.slots = slots
+        self.max_consumers = max_consumers
+        self.block_timeout = block_timeout
+        self.headroom = headroom
+        self.poll_interval = poll_interval
+        self.ring = None
+        self.fd = None
+        self.shape = None
+        self.dtype = None
+        self.published = 0
+        # Frames written while a blocking consumer had not read the slot yet
+        self.overruns = 0
+
+    # Create the ring for frames like `frame`. It is written to a temporary file
+    # and renamed, so a consumer never maps a half-initialized header.
+    def create(self, frame):
+        array = frame.array
+        slot_size = int(array.nbytes * self.headroom)
+        size = Ring.file_size(self.slots, slot_size, self.max_consumers)
+
+        tmp_path = self.path + ".tmp"
+        self.fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, size)
+        self.ring = Ring(mmap.mmap(self.fd, size), self.slots, slot_size, self.max_consumers)
+
+        self.shape = array.shape
+        self.dtype = array.dtype
+        dims = list(array.shape[1:]) + [0] * (4 - array.ndim)
+        caps = frame.caps.to_string().encode("utf-8")
+        if len(caps) >= CAPS_SIZE:
+            raise ValueError("Caps too long for the ring header")
+
+        HEADER.pack_into(self.ring.mm, 0, MAGIC, self.slots, slot_size, self.max_consumers, 0, 0)
+        SHAPE.pack_into(self.ring.mm, SHAPE_OFFSET, array.dtype.str.encode("ascii"), array.ndim, *dims)
+        self.ring.mm[CAPS_OFFSET:CAPS_OFFSET + len(caps)] = caps
+        os.replace(tmp_path, self.path)
+
+        logger.info("Publishing {0} slots of {1} bytes at {2}".format(self.slots, slot_size, self.path))
+
+    def publish(self, frame):
+        if self.ring is None:
+            self.create(frame)
+
+        array = frame.array
+        if array.shape[1:] != self.shape[1:] or array.dtype != self.dtype or array.nbytes > self.ring.slot_size:
+            raise ValueError("Frame of shape {0} does not fit the ring, created for {1}".format(array.shape, self.shape))
+
+        seq = self.published
+        self.wait_for_consumers(seq)
+
+        mm = self.ring.mm
+        offset = self.ring.slot_offset(seq)
+        SLOT.pack_into(mm, offset, 2 * seq + 1, frame.pts, frame.duration, array.nbytes)
+        numpy.ndarray(array.shape, array.dtype, buffer=mm, offset=offset + SLOT.size)[...] = array
+        struct.pack_into("<Q", mm, offset, 2 * seq + 2)
+
+        self.published = seq + 1
+        struct.pack_into("<Q", mm, PUBLISHED_OFFSET, self.published)
+
+    # Before overwriting the slot of frame seq - slots, wait until every blocking
+    # consumer has read it, for at most block_timeout
+    def wait_for_consumers(self, seq):
+        oldest = seq - self.slots
+        if oldest < 0:
+            return
+
+        deadline = time.perf_counter() + self.block_timeout
+        mm = self.ring.mm
+        for index in range(self.max_consumers):
+            offset = self.ring.consumer_offset(index)
+            while True:
+                pid, policy, cursor, lost = CONSUMER.unpack_from(mm, offset)
+                if pid == 0 or policy != POLICIES["block"] or cursor > oldest:
+                    break
+                if not pid_alive(pid):
+                    logger.warning("Removing dead consumer {0}".format(pid))
+                    CONSUMER.pack_into(mm, offset, 0, 0, 0, 0)
+                    break
+                if time.perf_counter() > deadline:
+                    self.overruns += 1
+                    break
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        if self.ring is None:
+            return
+        struct.pack_into("<I", self.ring.mm, CLOSED_OFFSET, 1)
+        self.ring.mm.close()
+        os.close(self.fd)
+        os.unlink(self.path)
+        self.ring = None
+
+class FanoutReader:
+    def __init__(self, name, policy="drop", timeout=10.0, poll_interval=0.0005, copy=False):
+        self.path = shm_path(name)
+        self.policy = policy
+        self.copy = copy
+        self.poll_interval = poll_interval
+        self.index = None
+        self.frames_read = 0
+        self.lost = 0
+        # Frames overwritten while the consumer was still reading them
+        self.torn = 0
+
+        deadline = time.perf_counter() + timeout
+        while not os.path.exists(self.path):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("No publisher at {0}".format(self.path))
+            time.sleep(0.01)
+
+        self.fd = os.open(self.path, os.O_RDWR)
+        mm = mmap.mmap(self.fd, 0)
+        magic, slots, slot_size, max_consumers, closed, published = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{0} is not a frame fan-out ring".format(self.path))
+        self.ring = Ring(mm, slots, slot_size, max_consumers)
+
+        dtype, ndim, *dims = SHAPE.unpack_from(mm, SHAPE_OFFSET)
+        self.dtype = numpy.dtype(dtype.rstrip(b"\x00").decode("ascii"))
+        self.dims = tuple(dims[:ndim - 1])
+        caps = bytes(mm[CAPS_OFFSET:CAPS_OFFSET + CAPS_SIZE]).rstrip(b"\x00").decode("utf-8")
+        self.caps = Gst.Caps.from_string(caps)
+
+        self.attach()
+
+    # Claim a free entry of the consumer table, starting at the newest frame
+    def attach(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            for index in range(self.ring.max_consumers):
+                offset = self.ring.consumer_offset(index)
+                pid = CONSUMER.unpack_from(self.ring.mm, offset)[0]
+                if pid == 0 or not pid_alive(pid):
+                    self.cursor = self.ring.published()
+                    CONSUMER.pack_into(self.ring.mm, offset, os.getpid(), POLICIES[self.policy], self.cursor, 0)
+                    self.index = index
+                    return
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        raise RuntimeError("All {0} consumer entries are in use".format(self.ring.max_consumers))
+
+    def set_cursor(self, cursor):
+        self.cursor = cursor
+        offset = self.ring.consumer_offset(self.index)
+        CONSUMER.pack_into(self.ring.mm, offset, os.getpid(), POLICIES[self.policy], cursor, self.lost)
+
+    # False if the publisher has started overwriting the frame last yielded by
+    # frames(), so whatever was computed from its array must be discarded
+    def intact(self):
+        return self.ring.slot_seq(self.cursor) == 2 * self.cursor + 2
+
+    # Yields a Frame per published frame. The array is a read-only view into the
+    # ring, valid until the next frame is requested, and only if intact() is still
+    # True after it was used. With copy, the array is a private copy and frames
+    # overwritten during the copy are skipped.
+    def frames(self):
+        row_size = self.dtype.itemsize * int(numpy.prod(self.dims, dtype=numpy.int64))
+        seq = self.cursor
+
+        while True:
+            published = self.ring.published()
+            if seq >= published:
+                if self.ring.closed():
+                    return
+                time.sleep(self.poll_interval)
+                continue
+
+            # Fell behind by more than the ring holds: skip ahead, to the middle of
+            # the ring so there is room before the publisher catches up again
+            if published - seq >= self.ring.slots:
+                skipped = published - seq - self.ring.slots // 2
+                self.lost += skipped
+                seq += skipped
+
+            offset = self.ring.slot_offset(seq)
+            slot_seq, pts, duration, size = SLOT.unpack_from(self.ring.mm, offset)
+            if slot_seq != 2 * seq + 2:
+                # Overwritten before we got to it
+                self.lost += 1
+                seq += 1
+                self.set_cursor(seq)
+                continue
+
+            array = numpy.ndarray((size // row_size,) + self.dims, self.dtype,
+                                  buffer=self.ring.mm, offset=offset + SLOT.size)
+            if self.copy:
+                array = array.copy()
+            else:
+                array.flags.writeable = False
+
+            # The publisher may have lapped us between the header and here
+            if self.ring.slot_seq(seq) != 2 * seq + 2:
+                self.torn += 1
+                seq += 1
+                self.set_cursor(seq)
+                continue
+
+            yield Frame(array, pts, duration, self.caps)
+
+            if not self.copy and self.ring.slot_seq(seq) != 2 * seq + 2:
+                self.torn += 1
+            self.frames_read += 1
+            seq += 1
+            self.set_cursor(seq)
+
+    def close(self):
+        if self.index is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            CONSUMER.pack_into(self.ring.mm, self.ring.consumer_offset(self.index), 0, 0, 0, 0)
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.index = None
+        self.ring.mm.close()
+        os.close(self.fd)
+
+# Decode `uri` once and publish its frames until EOS
+def publish_uri(uri, name, media="video", slots=8, block_timeout=1.0):
+    # Audio buffers vary in size, leave room for larger ones
+    publisher = FanoutPublisher(name, slots, block_timeout=block_timeout,
+                                headroom=1.0 if media == "video" else 4.0)
+    start = time.perf_counter()
+    try:
+        for frame in iter_frames(uri, media):
+            publisher.publish(frame)
+    finally:
+        publisher.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info("Published {0} frames in {1:.2f} s, {2} overruns".format(
+        publisher.published, elapsed, publisher.overruns))
+
+# A consumer that spends `delay` seconds per frame
+def consume(name, policy="drop", delay=0.0, copy=False):
+    player_core.init()
+    reader = FanoutReader(name, policy, copy=copy)
+    checksum = 0
+    start = time.perf_counter()
+    try:
+        for frame in reader.frames():
+            # Touch the data, as an analysis would
+            value = int(frame.array[::64].sum())
+            if delay:
+                time.sleep(delay)
+            # A view overwritten under us gave a meaningless value
+            if copy or reader.intact():
+                checksum += value
+    finally:
+        reader.close()
+
+    elapsed = time.perf_counter() - start
+    return {"policy": policy, "delay": delay, "frames": reader.frames_read, "lost": reader.lost,
+            "torn": reader.torn, "fps": reader.frames_read / elapsed if elapsed else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory fan-out of decoded frames")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="decode a URI and publish its frames")
+    publish.add_argument("uri")
+    publish.add_argument("--name", default="default", help="ring name")
+    publish.add_argument("--media", choices=("video", "audio"), default="video")
+    publish.add_argument("--slots", type=int, default=8, help="frames held by the ring")
+    publish.add_argument("--block-timeout", type=float, default=1.0, help="longest wait for a blocking consumer, in s")
+
+    consumer = subparsers.add_parser("consume", help="attach to a ring and read frames")
+    consumer.add_argument("--name", default="default", help="ring name")
+    consumer.add_argument("--policy", choices=tuple(POLICIES), default="drop")
+    consumer.add_argument("--delay", type=float, default=0.0, help="processing time per frame, in s")
+    consumer.add_argument("--copy", action="store_true", help="copy frames out of the ring instead of using views")
+
+    demo = subparsers.add_parser("demo", help="publish a URI to a fast blocking and a slow dropping consumer")
+    demo.add_argument("uri")
+    demo.add_argument("--slow-delay", type=float, default=0.05, help="processing time of the slow consumer, in s")
+
+    args = parser.parse_args()
+    player_core.init()
+
+    if args.command == "publish":
+        publish_uri(args.uri, args.name, args.media, args.slots, args.block_timeout)
+    elif args.command == "consume":
+        logger.info("{0}".format(consume(args.name, args.policy, args.delay, args.copy)))
+    else:
+        name = "demo-{0}".format(os.getpid())
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(2) as pool:
+            # Consumers wait for the ring to appear, then start at the newest frame
+            results = [pool.apply_async(consume, (name, "block", 0.0)),
+                       pool.apply_async(consume, (name, "drop", args.slow_delay))]
+            time.sleep(1)
+            publish_uri(args.uri, name)
+            for result in results:
+                logger.info("{0}".format(result.get()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import sys
+import time
+import gi
+import logging
+import numpy
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+gi.require_version("GstVideo", "1.0")
+
+from gi.repository import Gst, GLib, GObject, GstVideo
+
+logger = logging.getLogger(__name__)
+
+# Decodes a URI and yields video frames or audio chunks as NumPy arrays.
+#
+# The graph is the one from basic-tutorial-3.py, but the dynamic pad is linked to
+# a converter that ends in an appsink instead of autoaudiosink:
+#
+#   uridecodebin -> videoconvert -> appsink (video/x-raw,format=RGB)
+#   uridecodebin -> audioconvert -> audioresample -> appsink (audio/x-raw,format=F32LE)
+#
+# Arrays are views over the mapped Gst.Buffer memory (this needs the gst-python
+# overrides, where Gst.Buffer.map returns a MapInfo whose data is a memoryview).
+# The buffer stays mapped until the consumer asks for the next item, so copy the
+# array if you need to keep it around. The appsink holds at most `max_buffers`
+# buffers: when the consumer is slow, upstream blocks (or, with drop=True, the
+# oldest buffers are discarded), so memory use is bounded either way.
+
+VIDEO_CAPS = "video/x-raw,format=RGB"
+AUDIO_CAPS = "audio/x-raw,format=F32LE,layout=interleaved"
+
+class Frame:
+    def __init__(self, array, pts, duration, caps):
+        # A read-only view over the mapped buffer, valid until the next item is requested
+        self.array = array
+        self.pts = pts
+        self.duration = duration
+        self.caps = caps
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.source = None
+        self.convert = None
+        self.resample = None
+        self.sink = None
+        self.media = None
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, data):
+    sink_pad = data.convert.get_static_pad("sink")
+
+    # If our converter is already linked, we have nothing to do here
+    if sink_pad.is_linked():
+        return
+
+    # Check the new pad's type
+    new_pad_caps = new_pad.get_current_caps()
+    new_pad_type = new_pad_caps.get_structure(0).get_name()
+
+    if not new_pad_type.startswith("{0}/x-raw".format(data.media)):
+        logger.debug("It has type {0:s} which is not raw {1:s}. Ignoring.".format(new_pad_type, data.media))
+        return
+
+    ret = new_pad.link(sink_pad)
+    if not ret == Gst.PadLinkReturn.OK:
+        logger.error("Type is {0:s} but link failed".format(new_pad_type))
+
+def build_pipeline(uri, media, max_buffers, drop):
+    data = CustomData()
+    data.media = media
+
+    data.pipeline = Gst.Pipeline.new("frame-source")
+    data.source = Gst.ElementFactory.make("uridecodebin", "source")
+    data.sink = Gst.ElementFactory.make("appsink", "sink")
+
+    if media == "video":
+        data.convert = Gst.ElementFactory.make("videoconvert", "convert")
+        caps = VIDEO_CAPS
+    elif media == "audio":
+        data.convert = Gst.ElementFactory.make("audioconvert", "convert")
+        data.resample = Gst.ElementFactory.make("audioresample", "resample")
+        caps = AUDIO_CAPS
+    else:
+        raise ValueError("media must be 'video' or 'audio', not {0!r}".format(media))
+
+    elements = [e for e in (data.source, data.convert, data.resample, data.sink) if e is not None]
+    if not data.source or not data.convert or not data.sink or (media == "audio" and not data.resample):
+        raise RuntimeError("Not all elements could be created.")
+
+    data.source.set_property("uri", uri)
+
+    # Bound the memory held by the appsink, and pull as fast as the consumer allows
+    data.sink.set_property("caps", Gst.Caps.from_string(caps))
+    data.sink.set_property("max-buffers", max_buffers)
+    data.sink.set_property("drop", drop)
+    data.sink.set_property("sync", False)
+    data.sink.set_property("emit-signals", False)
+
+    for element in elements:
+        data.pipeline.add(element)
+
+    chain = [e for e in (data.convert, data.resample, data.sink) if e is not None]
+    for upstream, downstream in zip(chain, chain[1:]):
+        if not upstream.link(downstream):
+            raise RuntimeError("Elements could not be linked.")
+
+    data.source.connect("pad-added", pad_added_handler, data)
+
+    return data
+
+# Wrap the mapped memory into an array without copying it
+def video_array(memory, caps):
+    info = GstVideo.VideoInfo.new_from_caps(caps)
+    return numpy.ndarray(shape=(info.height, info.width, 3),
+                         dtype=numpy.uint8,
+                         buffer=memory,
+                         offset=info.offset[0],
+                         strides=(info.stride[0], 3, 1))
+
+def audio_array(memory, caps):
+    ret, channels = caps.get_structure(0).get_int("channels")
+    return numpy.frombuffer(memory, dtype="<f4").reshape(-1, channels)
+
+# Check the bus for errors or EOS without blocking. Returns True on EOS.
+def check_bus(bus):
+    msg = bus.pop_filtered(Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    if msg is None:
+        return False
+
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    return True
+
+# Yields a Frame for each decoded buffer of the first `media` ("video" or "audio")
+# stream of `uri`
+def iter_frames(uri, media="video", max_buffers=4, drop=False):
+    data = build_pipeline(uri, media, max_buffers, drop)
+    to_array = video_array if media == "video" else audio_array
+    bus = data.pipeline.get_bus()
+
+    ret = data.pipeline.set_state(Gst.State.PLAYING)
+    if ret == Gst.StateChangeReturn.FAILURE:
+        data.pipeline.set_state(Gst.State.NULL)
+        raise RuntimeError("Unable to set the pipeline to the playing state.")
+
+    try:
+        while True:
+            sample = data.sink.emit("try-pull-sample", 100 * Gst.MSECOND)
+            if sample is None:
+                # Timed out or EOS: find out which one from the bus
+                if check_bus(bus) or data.sink.get_property("eos"):
+                    break
+                continue
+
+            buffer = sample.get_buffer()
+            caps = sample.get_caps()
+            with buffer.map(Gst.MapFlags.READ) as info:
+                array = to_array(info.data, caps)
+                array.flags.writeable = False
+                yield Frame(array, buffer.pts, buffer.duration, caps)
+    finally:
+        data.pipeline.set_state(Gst.State.NULL)
+
+def iter_arrays(uri, media="video", max_buffers=4, drop=False):
+    for frame in iter_frames(uri, media, max_buffers, drop):
+        yield frame.array
+
+def tutorial_main():
+    logging.basicConfig(level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    Gst.init(sys.argv[:1])
+
+    uri = sys.argv[1] if len(sys.argv) > 1 else "https://gstreamer.freedesktop.org/data/media/sintel_trailer-480p.webm"
+    media = sys.argv[2] if len(sys.argv) > 2 else "video"
+
+    count = 0
+    start = time.perf_counter()
+    for frame in iter_frames(uri, media):
+        if count == 0:
+            logger.info("First {0} buffer: shape {1}, dtype {2}".format(media, frame.array.shape, frame.array.dtype))
+        count += 1
+
+    elapsed = time.perf_counter() - start
+    logger.info("{0} buffers in {1:.2f} s ({2:.1f}/s)".format(count, elapsed, count / elapsed))
+
+if __name__ == "__main__":
+    tutorial_main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import threading
+import collections
+import gi
+import logging
+
+import player_core
+from player_core import Gst, GLib, GObject, PlayerCore
+
+gi.require_version("GstPbutils", "1.0")
+
+from gi.repository import GstPbutils
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Gapless playlist playback on a single playbin.
+#
+# basic-tutorial-4.py and basic-tutorial-5.py play one URI and go to READY at EOS.
+# Here playbin's "about-to-finish" signal is used instead: it is emitted from a
+# streaming thread while the current item is still playing, and setting the next
+# URI from that handler makes playbin preroll it and switch over without leaving
+# PLAYING. No READY -> PLAYING cycle is paid per item.
+#
+# A short lookahead of upcoming items is probed in the background, so that broken
+# or unsupported entries are skipped before playbin ever sees them.
+#
+# The gap between items is measured from the buffers reaching the audio sink: the
+# end of the last buffer of one item (pts + duration, in running time) against the
+# start of the first buffer of the next.
+
+class PlaylistItem:
+    def __init__(self, uri):
+        self.uri = uri
+        # None until probed, then True or False
+        self.playable = None
+        self.duration = None
+
+class GaplessPlaylist:
+    def __init__(self, uris, lookahead=2, headless=False):
+        self.items = collections.deque(PlaylistItem(uri) for uri in uris)
+        self.lookahead = lookahead
+        self.lock = threading.Lock()
+        self.current = None
+        self.gaps = []
+        self.last_end = None
+        self.switching = False
+
+        self.core = PlayerCore(headless=headless)
+        self.core.playbin.connect("about-to-finish", self.about_to_finish_cb)
+        self.core.connect("state-changed", self.state_changed_cb)
+
+        # Measure the gaps on the audio output
+        audio_sink = self.core.playbin.get_property("audio-sink")
+        if audio_sink is None:
+            audio_sink = Gst.ElementFactory.make("autoaudiosink", "audiosink")
+            self.core.playbin.set_property("audio-sink", audio_sink)
+        audio_sink.get_static_pad("sink").add_probe(
+            Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_DOWNSTREAM, self.audio_probe_cb)
+
+        self.discoverer = None
+        self.prober = threading.Thread(target=self.probe_lookahead, daemon=True)
+        self.probe_wakeup = threading.Event()
+
+    # Probe the next `lookahead` items with the Discoverer, in the background
+    def probe_lookahead(self):
+        self.discoverer = GstPbutils.Discoverer.new(5 * Gst.SECOND)
+        while True:
+            self.probe_wakeup.wait()
+            self.probe_wakeup.clear()
+
+            with self.lock:
+                pending = [item for item in list(self.items)[:self.lookahead] if item.playable is None]
+
+            for item in pending:
+                try:
+                    info = self.discoverer.discover_uri(item.uri)
+                    item.playable = info.get_result() == GstPbutils.DiscovererResult.OK
+                    item.duration = info.get_duration()
+                except GLib.Error as err:
+                    logger.error("{0}: {1}".format(item.uri, err.message))
+                    item.playable = False
+
+    # Pop the next playable item. Items still being probed are assumed playable.
+    def next_item(self):
+        with self.lock:
+            while self.items:
+                item = self.items.popleft()
+                if item.playable is not False:
+                    self.probe_wakeup.set()
+                    return item
+                logger.info("Skipping {0}".format(item.uri))
+        return None
+
+    # This function is called by playbin from a streaming thread, shortly before
+    # the current item runs out of data. Setting the URI here queues the next item.
+    def about_to_finish_cb(self, playbin):
+        item = self.next_item()
+        if item is None:
+            return
+
+        self.current = item
+        playbin.set_property("uri", item.uri)
+        logger.info("Queued {0}".format(item.uri))
+
+    def audio_probe_cb(self, pad, info):
+        if info.type & Gst.PadProbeType.BUFFER:
+            buffer = info.get_buffer()
+            if buffer.pts == Gst.CLOCK_TIME_NONE:
+                return Gst.PadProbeReturn.OK
+
+            segment = pad.get_sticky_event(Gst.EventType.SEGMENT, 0)
+            running = segment.parse_segment().to_running_time(Gst.Format.TIME, buffer.pts) if segment else buffer.pts
+
+            if self.switching and self.last_end is not None:
+                # First buffer of the next item
+                self.gaps.append((running - self.last_end) / Gst.MSECOND)
+                logger.info("Gap between items: {0:.3f} ms".format(self.gaps[-1]))
+                self.switching = False
+
+            if buffer.duration != Gst.CLOCK_TIME_NONE:
+                self.last_end = running + buffer.duration
+        elif info.get_event().type == Gst.EventType.STREAM_START and self.last_end is not None:
+            # The current item has drained, the next buffer belongs to the next item
+            self.switching = True
+
+        return Gst.PadProbeReturn.OK
+
+    def state_changed_cb(self, core, msg):
+        old_state, new_state, pending_state = msg.parse_state_changed()
+        if new_state == Gst.State.PLAYING:
+            self.probe_wakeup.set()
+
+    def run(self):
+        item = self.next_item()
+        if item is None:
+            logger.error("Empty playlist.")
+            return
+
+        self.prober.start()
+        self.current = item
+        self.core.set_uri(item.uri)
+        self.core.run()
+
+        if self.gaps:
+            logger.info("{0} transitions, max gap {1:.3f} ms".format(len(self.gaps), max(self.gaps, key=abs)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Gapless playlist playback")
+    parser.add_argument("uris", nargs="+", help="URIs to play in order")
+    parser.add_argument("--lookahead", type=int, default=2, help="items to probe ahead")
+    parser.add_argument("--headless", action="store_true", help="decode to fakesinks as fast as possible")
+    args = parser.parse_args()
+
+    player_core.init()
+    GaplessPlaylist(args.uris, args.lookahead, args.headless).run()
+
+if __name__ == "__main__":
+    main()
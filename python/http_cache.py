@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import statistics
+import http.server
+import urllib.parse
+import urllib.request
+import concurrent.futures
+import logging
+
+import player_core
+from player_core import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Local range-request disk cache for http:// sources.
+#
+# The tutorials play http://docs.gstreamer.com/media/sintel_trailer-480p.webm, so
+# every run and every seek downloads the same bytes again. CachingProxy is a small
+# HTTP proxy on 127.0.0.1 that souphttpsrc is pointed at through its "proxy"
+# property, from the "source-setup" signal of playbin or uridecodebin:
+#
+#   proxy = CachingProxy(RangeCache())
+#   proxy.attach(playbin)
+#
+# The URI itself is not changed. Each remote file is stored in a sparse file in the
+# cache directory, in CHUNK_SIZE chunks, next to a JSON file listing the chunks it
+# holds. A request, including the ranged request souphttpsrc sends after a seek,
+# is served from the chunks on disk, and only the missing ones are fetched from the
+# origin with a Range request. While a request is being served, the chunks ahead
+# of it are fetched in the background, so sequential playback rarely waits on the
+# network.
+#
+# Entries are evicted whole, least recently used first, once the cache holds more
+# than max_bytes. A stored entry is validated once per process against the ETag
+# and Last-Modified of the origin, and dropped if the file changed.
+#
+# `http_cache.py` without a URL serves the benchmark media from a local origin
+# server with added latency and a bandwidth limit, and compares direct playback
+# with a cold and a warm cache.
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                         "gstreamer_examples", "http")
+
+CHUNK_SIZE = 256 * 1024
+# Most chunks fetched from the origin in one request
+FETCH_CHUNKS = 16
+# Chunks to keep ahead of the chunk being served
+PREFETCH_CHUNKS = 32
+
+class CacheEntry:
+    def __init__(self, url, data_path, meta_path):
+        self.url = url
+        self.data_path = data_path
+        self.meta_path = meta_path
+        self.size = None
+        self.content_type = "application/octet-stream"
+        self.validator = None
+        self.validated = False
+        self.chunks = set()
+        # Bytes in `chunks`, kept up to date with it so it can be read without the lock
+        self.cached = 0
+        self.last_used = 0.0
+        self.readers = 0
+        self.fd = None
+        self.lock = threading.Lock()
+        # Chunk index -> Event set when the fetch that claimed it is done
+        self.fetching = {}
+
+    def num_chunks(self):
+        return (self.size + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+    def chunk_range(self, index):
+        start = index * CHUNK_SIZE
+        return start, min(start + CHUNK_SIZE, self.size)
+
+    def cached_bytes(self):
+        return self.cached
+
+    def set_chunks(self, chunks):
+        self.chunks = set(chunks)
+        self.cached = sum(end - start for start, end in map(self.chunk_range, self.chunks))
+
+    # Called with the lock held
+    def add_chunk(self, index):
+        if index not in self.chunks:
+            self.chunks.add(index)
+            start, end = self.chunk_range(index)
+            self.cached += end - start
+
+    def load(self):
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        self.size = meta["size"]
+        self.content_type = meta["content_type"]
+        self.validator = meta["validator"]
+        self.set_chunks(meta["chunks"])
+        self.last_used = meta["last_used"]
+
+    def save(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "url": self.url,
+                "size": self.size,
+                "content_type": self.content_type,
+                "validator": self.validator,
+                "chunks": sorted(self.chunks),
+                "last_used": self.last_used,
+            }, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.data_path, os.O_RDWR | os.O_CREAT, 0o644)
+            # Reserve the full size without writing anything, the file stays sparse
+            if os.fstat(self.fd).st_size != self.size:
+                os.ftruncate(self.fd, self.size)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class RangeCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=1024 * 1024 * 1024, timeout=10):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        # Bytes sent to clients, sent without waiting, and fetched from the origin on
+        # demand or ahead of time
+        self.served_bytes = 0
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+        self.prefetch_bytes = 0
+        self.origin_requests = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".data", base + ".json"
+
+    def stats(self):
+        return {
+            "served_bytes": self.served_bytes,
+            "hit_bytes": self.hit_bytes,
+            "miss_bytes": self.miss_bytes,
+            "prefetch_bytes": self.prefetch_bytes,
+            "origin_requests": self.origin_requests,
+            # Share of the served bytes that did not wait on the origin
+            "hit_rate": self.hit_bytes / max(self.served_bytes, 1),
+            "bytes_saved": self.served_bytes - self.miss_bytes - self.prefetch_bytes,
+        }
+
+    # The entry for `url`, validated against the origin. The caller must release() it.
+    def acquire(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                entry = self.entries[url] = CacheEntry(url, *self.paths(url))
+                if os.path.exists(entry.meta_path):
+                    try:
+                        entry.load()
+                    except (OSError, ValueError, KeyError):
+                        logger.warning("Dropping unreadable cache entry for {0}".format(url))
+                        entry.set_chunks(())
+            entry.readers += 1
+            entry.last_used = time.time()
+
+        try:
+            with entry.lock:
+                if not entry.validated:
+                    self.validate(entry)
+                entry.open()
+        except Exception:
+            self.release(entry)
+            raise
+        return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.readers -= 1
+        self.evict()
+
+    def request(self, url, first=None, last=None, method="GET"):
+        headers = {}
+        if first is not None:
+            headers["Range"] = "bytes={0}-{1}".format(first, last)
+        with self.lock:
+            self.origin_requests += 1
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers, method=method),
+                                      timeout=self.timeout)
+
+    # Check the stored chunks still belong to the file on the origin
+    def validate(self, entry):
+        with self.request(entry.url, method="HEAD") as response:
+            length = response.headers.get("Content-Length")
+            if length is None or response.headers.get("Accept-Ranges") != "bytes":
+                raise IOError("{0} does not support range requests".format(entry.url))
+
+            size = int(length)
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            entry.content_type = response.headers.get("Content-Type", entry.content_type)
+
+        if entry.chunks and (size != entry.size or validator is None or validator != entry.validator):
+            logger.info("{0} changed on the origin, dropping {1} cached chunks".format(entry.url, len(entry.chunks)))
+            entry.set_chunks(())
+            entry.close()
+            if os.path.exists(entry.data_path):
+                os.remove(entry.data_path)
+
+        entry.size = size
+        entry.validator = validator
+        entry.validated = True
+        entry.save()
+
+    # Make sure chunk `index` is on disk, fetching it along with up to `limit` - 1
+    # following missing chunks. Returns True if it had to wait for the origin.
+    def fill(self, entry, index, limit=FETCH_CHUNKS, prefetch=False):
+        waited = False
+        while True:
+            with entry.lock:
+                if index in entry.chunks:
+                    return waited
+
+                event = entry.fetching.get(index)
+                if event is None:
+                    # Claim a run of chunks nobody has and nobody is fetching
+                    event = threading.Event()
+                    last = index
+                    while (last + 1 < min(index + limit, entry.num_chunks()) and
+                           last + 1 not in entry.chunks and last + 1 not in entry.fetching):
+                        last += 1
+                    claimed = range(index, last + 1)
+                    for i in claimed:
+                        entry.fetching[i] = event
+                else:
+                    claimed = None
+
+            waited = True
+            if claimed is None:
+                # Someone else is fetching it. If that fails, try again ourselves.
+                event.wait()
+                continue
+
+            try:
+                self.fetch(entry, claimed, prefetch)
+            finally:
+                with entry.lock:
+                    for i in claimed:
+                        del entry.fetching[i]
+                event.set()
+
+    def fetch(self, entry, chunks, prefetch):
+        first, end = entry.chunk_range(chunks[0])[0], entry.chunk_range(chunks[-1])[1]
+        with self.request(entry.url, first, end - 1) as response:
+            if response.status != 206 and first != 0:
+                raise IOError("{0} ignored the range request".format(entry.url))
+
+            offset = first
+            for index in chunks:
+                start, stop = entry.chunk_range(index)
+                data = response.read(stop - start)
+                if len(data) != stop - start:
+                    raise IOError("Short read from {0}".format(entry.url))
+                os.pwrite(entry.fd, data, offset)
+                offset += len(data)
+
+                with entry.lock:
+                    entry.add_chunk(index)
+                with self.lock:
+                    if prefetch:
+                        self.prefetch_bytes += len(data)
+                    else:
+                        self.miss_bytes += len(data)
+
+        with entry.lock:
+            entry.save()
+
+    # The bytes of chunk `index`, from disk
+    def read(self, entry, index):
+        waited = self.fill(entry, index)
+        start, end = entry.chunk_range(index)
+        data = os.pread(entry.fd, end - start, start)
+        with self.lock:
+            self.served_bytes += len(data)
+            if not waited:
+                self.hit_bytes += len(data)
+        return data
+
+    # Next chunk in [index, index + count) that is neither cached nor being fetched
+    def next_missing(self, entry, index, count):
+        with entry.lock:
+            for i in range(index, min(index + count, entry.num_chunks())):
+                if i not in entry.chunks and i not in entry.fetching:
+                    return i
+        return None
+
+    # Remove least recently used entries until the cache fits in max_bytes. Entries
+    # being read are kept. Sizes come from the per-entry counters, the chunk sets
+    # may be growing under fetches in other threads.
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda entry: entry.last_used)
+            total = sum(entry.cached_bytes() for entry in entries)
+
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry.readers > 0:
+                    continue
+
+                logger.info("Evicting {0}".format(entry.url))
+                total -= entry.cached_bytes()
+                entry.close()
+                for path in (entry.data_path, entry.meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                del self.entries[entry.url]
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def do_GET(self):
+        self.serve(True)
+
+    # Proxy requests carry the absolute URL, rewritten ones /?url=<quoted URL>
+    def target_url(self):
+        if self.path.startswith("http://"):
+            return self.path
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        return query.get("url", [None])[0]
+
+    def serve(self, body):
+        proxy = self.server.proxy
+        url = self.target_url()
+        if url is None:
+            self.send_error(400, "No URL")
+            return
+
+        try:
+            entry = proxy.cache.acquire(url)
+        except (IOError, ValueError) as err:
+            logger.error("{0}: {1}".format(url, err))
+            self.send_error(502, str(err))
+            return
+
+        try:
+            first, last = parse_range(self.headers.get("Range"), entry.size)
+            if first is None:
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */{0}".format(entry.size))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            partial = self.headers.get("Range") is not None
+            self.send_response(206 if partial else 200)
+            self.send_header("Content-Type", entry.content_type)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(last - first + 1))
+            if partial:
+                self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(first, last, entry.size))
+            self.end_headers()
+
+            if body:
+                self.send_body(proxy, entry, first, last)
+        except (BrokenPipeError, ConnectionResetError):
+            # souphttpsrc drops the connection when it seeks
+            pass
+        except IOError as err:
+            logger.error("{0}: {1}".format(url, err))
+            self.close_connection = True
+        finally:
+            proxy.cache.release(entry)
+
+    def send_body(self, proxy, entry, first, last):
+        for index in range(first // CHUNK_SIZE, last // CHUNK_SIZE + 1):
+            proxy.prefetch(entry, index + 1)
+
+            data = proxy.cache.read(entry, index)
+            start = index * CHUNK_SIZE
+            self.wfile.write(data[max(first - start, 0):last + 1 - start])
+
+# Parse a Range header. Returns (first, last) inclusive, (None, None) when not
+# satisfiable. Only the first range of a multi-range request is served.
+def parse_range(header, size):
+    if header is None:
+        return 0, size - 1
+    if not header.startswith("bytes="):
+        return 0, size - 1
+
+    spec = header[len("bytes="):].split(",")[0].strip()
+    start, sep, end = spec.partition("-")
+    if not start:
+        first, last = max(size - int(end), 0), size - 1
+    else:
+        first, last = int(start), min(int(end), size - 1) if end else size - 1
+
+    if first >= size or first > last:
+        return None, None
+    return first, last
+
+class CachingProxy:
+    def __init__(self, cache, port=0, prefetch_chunks=PREFETCH_CHUNKS):
+        self.cache = cache
+        self.prefetch_chunks = prefetch_chunks
+        self.prefetcher = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), ProxyHandler)
+        self.server.daemon_threads = True
+        self.server.proxy = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        return "http://127.0.0.1:{0}".format(self.server.server_address[1])
+
+    # Rewrite `url` to go through the proxy, for sources without a "proxy" property
+    def uri(self, url):
+        return "{0}/?url={1}".format(self.address, urllib.parse.quote(url, safe=""))
+
+    # Route the http:// sources of a playbin or uridecodebin through the proxy
+    def attach(self, element):
+        element.connect("source-setup", self.source_setup_cb)
+
+    def source_setup_cb(self, element, source):
+        uri = source.get_property("location") if source.find_property("location") else None
+        if source.find_property("proxy") and uri and uri.startswith("http://"):
+            source.set_property("proxy", self.address)
+
+    # Fetch the first missing chunk ahead of `index` in the background
+    def prefetch(self, entry, index):
+        missing = self.cache.next_missing(entry, index, self.prefetch_chunks)
+        if missing is not None:
+            self.prefetcher.submit(self.prefetch_worker, entry, missing)
+
+    def prefetch_worker(self, entry, index):
+        # Hold the entry like a request does, so it is not evicted under us
+        try:
+            entry = self.cache.acquire(entry.url)
+        except IOError:
+            return
+
+        try:
+            self.cache.fill(entry, index, prefetch=True)
+        except IOError as err:
+            logger.warning("Prefetch of {0} failed: {1}".format(entry.url, err))
+        finally:
+            self.cache.release(entry)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.prefetcher.shutdown(wait=True)
+
+# A local stand-in for the remote server: serves one file with range support,
+# `latency` seconds of delay per request and at most `rate` bytes per second
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def do_GET(self):
+        self.serve(True)
+
+    def serve(self, body):
+        origin = self.server
+        time.sleep(origin.latency)
+
+        size = os.path.getsize(origin.path)
+        first, last = parse_range(self.headers.get("Range"), size)
+        if first is None:
+            self.send_error(416)
+            return
+
+        partial = self.headers.get("Range") is not None
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "video/webm")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"{0}"'.format(int(os.path.getmtime(origin.path))))
+        self.send_header("Content-Length", str(last - first + 1))
+        if partial:
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(first, last, size))
+        self.end_headers()
+        if not body:
+            return
+
+        try:
+            with open(origin.path, "rb") as f:
+                f.seek(first)
+                remaining = last - first + 1
+                while remaining > 0:
+                    data = f.read(min(64 * 1024, remaining))
+                    self.wfile.write(data)
+                    origin.sent_bytes += len(data)
+                    remaining -= len(data)
+                    time.sleep(len(data) / origin.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def start_origin(path, latency=0.05, rate=4 * 1024 * 1024):
+    origin = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    origin.daemon_threads = True
+    origin.path = path
+    origin.latency = latency
+    origin.rate = rate
+    origin.sent_bytes = 0
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    return origin, "http://127.0.0.1:{0}/{1}".format(origin.server_address[1], os.path.basename(path))
+
+def wait_async_done(playbin):
+    msg = playbin.get_bus().timed_pop_filtered(30 * Gst.SECOND, Gst.MessageType.ASYNC_DONE | Gst.MessageType.ERROR)
+    if msg is None:
+        raise RuntimeError("Timed out waiting for ASYNC_DONE.")
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+# Preroll `url` and seek to each target. Returns the preroll time and the seek latencies.
+def run_session(url, targets, proxy=None):
+    playbin = Gst.ElementFactory.make("playbin", "playbin")
+    playbin.set_property("uri", url)
+    playbin.set_property("video-sink", Gst.ElementFactory.make("fakesink", "videosink"))
+    playbin.set_property("audio-sink", Gst.ElementFactory.make("fakesink", "audiosink"))
+    if proxy is not None:
+        proxy.attach(playbin)
+
+    start = time.perf_counter()
+    playbin.set_state(Gst.State.PAUSED)
+    wait_async_done(playbin)
+    preroll = time.perf_counter() - start
+
+    latencies = []
+    for target in targets:
+        start = time.perf_counter()
+        playbin.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, target)
+        wait_async_done(playbin)
+        latencies.append(time.perf_counter() - start)
+
+    playbin.set_state(Gst.State.NULL)
+    return preroll, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Range-request disk cache for http:// sources")
+    parser.add_argument("url", nargs="?", help="http:// URL to play, default: local origin stand-in")
+    parser.add_argument("--cache-dir", help="cache directory, default: a fresh temporary directory")
+    parser.add_argument("--max-mb", type=int, default=1024, help="cache size limit")
+    parser.add_argument("--seeks", type=int, default=10, help="number of seek targets")
+    parser.add_argument("--latency", type=float, default=50, help="origin stand-in latency per request, in ms")
+    parser.add_argument("--rate", type=float, default=4, help="origin stand-in bandwidth, in MB/s")
+    args = parser.parse_args()
+
+    player_core.init()
+
+    url = args.url
+    if url is None:
+        from bench_tutorials import generate_media
+        origin, url = start_origin(generate_media(), args.latency / 1000, args.rate * 1024 * 1024)
+
+    cache = RangeCache(args.cache_dir or tempfile.mkdtemp(prefix="http-cache-"), args.max_mb * 1024 * 1024)
+    proxy = CachingProxy(cache)
+
+    playbin = Gst.ElementFactory.make("playbin", "playbin")
+    playbin.set_property("uri", url)
+    playbin.set_property("video-sink", Gst.ElementFactory.make("fakesink", "videosink"))
+    playbin.set_property("audio-sink", Gst.ElementFactory.make("fakesink", "audiosink"))
+    playbin.set_state(Gst.State.PAUSED)
+    wait_async_done(playbin)
+    ret, duration = playbin.query_duration(Gst.Format.TIME)
+    playbin.set_state(Gst.State.NULL)
+    if not ret:
+        logger.error("Could not query duration.")
+        sys.exit(1)
+
+    # Evenly spaced targets, visited in a shuffled but deterministic order
+    step = duration // (args.seeks + 1)
+    targets = [step * (1 + (i * 7) % args.seeks) for i in range(args.seeks)]
+
+    for name, session_proxy in (("direct", None), ("cold", proxy), ("warm", proxy)):
+        before = cache.stats()
+        preroll, latencies = run_session(url, targets, session_proxy)
+        after = cache.stats()
+
+        logger.info("{0:6s} preroll {1:7.1f} ms  seek median {2:7.1f} ms  max {3:7.1f} ms".format(
+            name, preroll * 1000, statistics.median(latencies) * 1000, max(latencies) * 1000))
+        if session_proxy is not None:
+            served = after["served_bytes"] - before["served_bytes"]
+            logger.info("{0:6s} hit rate {1:5.1%}  served {2:.1f} MB  saved {3:.1f} MB  origin requests {4}".format(
+                name, (after["hit_bytes"] - before["hit_bytes"]) / max(served, 1), served / 1e6,
+                (after["bytes_saved"] - before["bytes_saved"]) / 1e6,
+                after["origin_requests"] - before["origin_requests"]))
+
+    proxy.close()
+
+if __name__ == "__main__":
+    main()
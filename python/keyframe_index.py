@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import bisect
+import hashlib
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logger = logging.getLogger(__name__)
+
+# On-disk keyframe index of a local media file.
+#
+# The index is built once by a demux-only scan (filesrc -> parsebin -> fakesink,
+# nothing is decoded) that records the timestamp of every video buffer not flagged
+# DELTA_UNIT. It is stored as JSON in the cache directory, under a key made of the
+# file's path, mtime and size, so a modified file is scanned again.
+#
+# With the index, a seek can target the exact keyframe position with an ACCURATE
+# seek instead of asking the demuxer to look up its own index with KEY_UNIT.
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                         "gstreamer_examples", "keyframes")
+
+class KeyframeIndex:
+    def __init__(self, path, keyframes):
+        self.path = path
+        # Sorted keyframe timestamps, in nanoseconds
+        self.keyframes = keyframes
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    # Returns the last keyframe at or before `position`
+    def keyframe_before(self, position):
+        i = bisect.bisect_right(self.keyframes, position)
+        return self.keyframes[i - 1] if i else 0
+
+    # Returns the keyframe closest to `position`
+    def keyframe_nearest(self, position):
+        i = bisect.bisect_left(self.keyframes, position)
+        candidates = self.keyframes[max(0, i - 1):i + 1]
+        if not candidates:
+            return 0
+        return min(candidates, key=lambda k: abs(k - position))
+
+    def save(self, cache_dir=CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, cache_key(self.path) + ".json")
+
+        # Write to a temporary file first so a reader never sees a partial index
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"path": self.path, "keyframes": self.keyframes}, f)
+        os.replace(tmp_path, cache_path)
+
+    # Returns the cached index of `path`, or None if there is none or the file changed
+    @classmethod
+    def load(cls, path, cache_dir=CACHE_DIR):
+        path = os.path.abspath(path)
+        try:
+            with open(os.path.join(cache_dir, cache_key(path) + ".json")) as f:
+                return cls(path, json.load(f)["keyframes"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # Returns the cached index of `path`, scanning the file if needed
+    @classmethod
+    def load_or_build(cls, path, cache_dir=CACHE_DIR):
+        index = cls.load(path, cache_dir)
+        if index is None:
+            index = cls(os.path.abspath(path), scan_keyframes(path))
+            index.save(cache_dir)
+        return index
+
+    # Same as load() but for a URI. Only file:// URIs can be indexed.
+    @classmethod
+    def load_uri(cls, uri, cache_dir=CACHE_DIR):
+        if not uri.startswith("file://"):
+            return None
+        return cls.load(Gst.uri_get_location(uri), cache_dir)
+
+def cache_key(path):
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = "{0}\0{1}\0{2}".format(path, st.st_mtime_ns, st.st_size)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.source = None
+        self.parser = None
+        self.video_pad = None
+        self.keyframes = []
+
+# This function will be called by the pad-added signal of parsebin. Every stream
+# must be linked, otherwise the demuxer stops with not-negotiated/not-linked.
+def pad_added_handler(src, new_pad, data):
+    sink = Gst.ElementFactory.make("fakesink", None)
+    sink.set_property("sync", False)
+    data.pipeline.add(sink)
+    sink.sync_state_with_parent()
+
+    ret = new_pad.link(sink.get_static_pad("sink"))
+    if not ret == Gst.PadLinkReturn.OK:
+        logger.error("Could not link pad '{0:s}'".format(new_pad.get_name()))
+        return
+
+    caps = new_pad.get_current_caps() or new_pad.query_caps(None)
+    if data.video_pad is None and caps.get_structure(0).get_name().startswith("video/"):
+        data.video_pad = new_pad
+        new_pad.add_probe(Gst.PadProbeType.BUFFER, keyframe_probe_cb, data)
+
+def keyframe_probe_cb(pad, info, data):
+    buffer = info.get_buffer()
+    if not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT):
+        timestamp = buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else buffer.dts
+        if timestamp != Gst.CLOCK_TIME_NONE:
+            data.keyframes.append(timestamp)
+    return Gst.PadProbeReturn.OK
+
+# Scans `path` without decoding and returns the sorted keyframe timestamps of its
+# first video stream
+def scan_keyframes(path):
+    data = CustomData()
+
+    data.pipeline = Gst.Pipeline.new("keyframe-scan")
+    data.source = Gst.ElementFactory.make("filesrc", "source")
+    data.parser = Gst.ElementFactory.make("parsebin", "parser")
+
+    if not data.source or not data.parser:
+        raise RuntimeError("Not all elements could be created.")
+
+    data.source.set_property("location", path)
+    data.pipeline.add(data.source)
+    data.pipeline.add(data.parser)
+    data.source.link(data.parser)
+    data.parser.connect("pad-added", pad_added_handler, data)
+
+    ret = data.pipeline.set_state(Gst.State.PLAYING)
+    if ret == Gst.StateChangeReturn.FAILURE:
+        data.pipeline.set_state(Gst.State.NULL)
+        raise RuntimeError("Unable to set the pipeline to the playing state.")
+
+    bus = data.pipeline.get_bus()
+    msg = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    data.pipeline.set_state(Gst.State.NULL)
+
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    return sorted(set(data.keyframes))
+
+def main():
+    logging.basicConfig(level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    Gst.init(sys.argv[:1])
+
+    for path in sys.argv[1:]:
+        index = KeyframeIndex.load_or_build(path)
+        logger.info("{0}: {1} keyframes".format(path, len(index)))
+
+if __name__ == "__main__":
+    main()
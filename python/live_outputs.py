@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import time
+import argparse
+import threading
+import logging
+
+import player_core
+from player_core import Gst, GLib
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Adding, removing and swapping outputs while the pipeline keeps PLAYING.
+#
+# basic-tutorial-3.py links audioconvert straight to autoaudiosink, and stop_cb in
+# basic-tutorial-5.py goes to READY, so any change of output means a state change
+# of the whole pipeline. Here the stream goes into a tee, and every output is a
+# branch of its own:
+#
+#   ... ! tee ! queue ! <output>
+#
+# Attaching a branch needs no blocking: it is added, brought to the pipeline state
+# and linked to a new tee pad. Detaching or swapping one uses an IDLE probe on its
+# tee pad, which runs when no buffer is being pushed on that pad and holds it
+# until the callback returns. The tee's streaming thread, and so every other
+# branch, only waits for the relinking itself. A detached branch is drained with
+# an EOS first, so a recording muxer can finalize its file, and is removed from the
+# main loop once the EOS reached its sink.
+#
+# The cost of an operation is measured as the longest gap between two buffers on
+# the tee's sink pad while it runs, next to the time spent in the probe callback.
+
+class Output:
+    def __init__(self, name, bin, tee_pad):
+        self.name = name
+        self.bin = bin
+        self.tee_pad = tee_pad
+        self.sink_pad = bin.get_static_pad("sink")
+
+class LiveOutputs:
+    def __init__(self, pipeline, tee):
+        self.pipeline = pipeline
+        self.tee = tee
+        self.outputs = {}
+        self.branches = 0
+        # (operation, output name, ms spent in the probe callback)
+        self.stats = []
+
+        # Buffers on unlinked tee pads are dropped instead of stopping the stream
+        tee.set_property("allow-not-linked", True)
+
+        self.last_arrival = None
+        self.max_gap = 0.0
+        tee.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.arrival_probe_cb)
+
+    def arrival_probe_cb(self, pad, info):
+        now = time.perf_counter()
+        if self.last_arrival is not None:
+            self.max_gap = max(self.max_gap, now - self.last_arrival)
+        self.last_arrival = now
+        return Gst.PadProbeReturn.OK
+
+    # Longest gap between buffers entering the tee since the last call, in ms
+    def take_max_gap(self):
+        gap, self.max_gap = self.max_gap, 0.0
+        return gap * 1000
+
+    # A branch from a gst-launch description, e.g.
+    # "audioconvert ! wavenc ! filesink location=out.wav", behind a queue
+    def make_branch(self, name, description):
+        bin = Gst.parse_bin_from_description("queue ! " + description, True)
+        # Unique, an output swapped twice has two branches alive for a moment
+        bin.set_name("output-{0}-{1}".format(name, self.branches))
+        self.branches += 1
+        return bin
+
+    def attach(self, name, description):
+        if name in self.outputs:
+            raise ValueError("Output {0} already exists".format(name))
+
+        bin = self.make_branch(name, description)
+        self.pipeline.add(bin)
+        bin.sync_state_with_parent()
+
+        tee_pad = self.tee.get_request_pad("src_%u")
+        if tee_pad.link(bin.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+            self.tee.release_request_pad(tee_pad)
+            bin.set_state(Gst.State.NULL)
+            self.pipeline.remove(bin)
+            raise RuntimeError("Could not link output {0}".format(name))
+
+        self.outputs[name] = Output(name, bin, tee_pad)
+        self.stats.append(("attach", name, 0.0))
+        logger.info("Attached {0}: {1}".format(name, description))
+
+    # Remove an output. With `drain`, an EOS is sent through the branch first and
+    # it is removed once the EOS reached its sink (needs a running main loop).
+    def detach(self, name, drain=True):
+        output = self.outputs.pop(name)
+
+        def idle_cb(pad, info):
+            start = time.perf_counter()
+            pad.unlink(output.sink_pad)
+            self.stats.append(("detach", name, (time.perf_counter() - start) * 1000))
+
+            if drain:
+                self.wait_for_eos(output, lambda: self.remove(output, True))
+                output.sink_pad.send_event(Gst.Event.new_eos())
+            else:
+                GLib.idle_add(self.remove, output, True)
+            return Gst.PadProbeReturn.REMOVE
+
+        output.tee_pad.add_probe(Gst.PadProbeType.IDLE, idle_cb)
+
+    # Replace the output `name` by a new branch, on the same tee pad
+    def swap(self, name, description, drain=False):
+        old = self.outputs[name]
+        bin = self.make_branch(name, description)
+        self.pipeline.add(bin)
+        bin.sync_state_with_parent()
+        new = Output(name, bin, old.tee_pad)
+
+        def idle_cb(pad, info):
+            start = time.perf_counter()
+            pad.unlink(old.sink_pad)
+            pad.link(new.sink_pad)
+            self.stats.append(("swap", name, (time.perf_counter() - start) * 1000))
+
+            if drain:
+                self.wait_for_eos(old, lambda: self.remove(old, False))
+                old.sink_pad.send_event(Gst.Event.new_eos())
+            else:
+                GLib.idle_add(self.remove, old, False)
+            return Gst.PadProbeReturn.REMOVE
+
+        self.outputs[name] = new
+        old.tee_pad.add_probe(Gst.PadProbeType.IDLE, idle_cb)
+        logger.info("Swapping {0} to {1}".format(name, description))
+
+    # Call `done` from the main loop once an EOS reaches the sinks of `output`. It
+    # must return False, like any one-shot GLib source callback.
+    def wait_for_eos(self, output, done):
+        sinks = list(output.bin.iterate_sinks())
+        remaining = [len(sinks)]
+        lock = threading.Lock()
+
+        def eos_probe_cb(pad, info):
+            if info.get_event().type != Gst.EventType.EOS:
+                return Gst.PadProbeReturn.OK
+
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    GLib.idle_add(done)
+            # Do not let the EOS reach the bus as if the pipeline had ended
+            return Gst.PadProbeReturn.DROP
+
+        for sink in sinks:
+            sink.get_static_pad("sink").add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, eos_probe_cb)
+
+    def remove(self, output, release_pad):
+        output.bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(output.bin)
+        if release_pad:
+            self.tee.release_request_pad(output.tee_pad)
+        logger.info("Removed {0}".format(output.bin.get_name()))
+        return False
+
+# The demo: a live test tone into a tee, with outputs changed on a timer
+def main():
+    parser = argparse.ArgumentParser(description="Attach, detach and swap outputs of a playing pipeline")
+    parser.add_argument("--record", default="recording.wav", help="file for the recording branch")
+    parser.add_argument("--headless", action="store_true", help="use synchronized fakesinks instead of audio sinks")
+    args = parser.parse_args()
+
+    player_core.init()
+
+    sink = "fakesink sync=true" if args.headless else "autoaudiosink"
+    pipeline = Gst.parse_launch("audiotestsrc is-live=true wave=sine ! audioconvert ! tee name=tee")
+    outputs = LiveOutputs(pipeline, pipeline.get_by_name("tee"))
+    outputs.attach("main", sink)
+
+    loop = GLib.MainLoop()
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+
+    def error_cb(bus, msg):
+        err, debug_info = msg.parse_error()
+        logger.error("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+        loop.quit()
+    bus.connect("message::error", error_cb)
+
+    # Full READY -> PLAYING cycle, the way stop_cb and play_cb change outputs today
+    def restart():
+        pipeline.set_state(Gst.State.READY)
+        pipeline.set_state(Gst.State.PLAYING)
+
+    steps = [
+        ("baseline", lambda: None),
+        ("attach recording", lambda: outputs.attach("record", "audioconvert ! wavenc ! filesink location=" + args.record)),
+        ("attach second sink", lambda: outputs.attach("second", "fakesink sync=true")),
+        ("swap main sink", lambda: outputs.swap("main", sink)),
+        ("detach recording", lambda: outputs.detach("record")),
+        ("detach second sink", lambda: outputs.detach("second", drain=False)),
+        ("state change cycle", restart),
+    ]
+
+    def run_step():
+        if run_step.previous is not None:
+            logger.info("{0:20s} max gap {1:7.2f} ms".format(run_step.previous, outputs.take_max_gap()))
+        if not steps:
+            loop.quit()
+            return False
+
+        run_step.previous, action = steps.pop(0)
+        outputs.take_max_gap()
+        action()
+        return True
+    run_step.previous = None
+
+    pipeline.set_state(Gst.State.PLAYING)
+    GLib.timeout_add_seconds(2, run_step)
+    loop.run()
+
+    for operation, name, blocked in outputs.stats:
+        logger.info("{0:7s} {1:8s} pad held {2:6.3f} ms".format(operation, name, blocked))
+    pipeline.set_state(Gst.State.NULL)
+
+if __name__ == "__main__":
+    main()
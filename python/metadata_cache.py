@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import multiprocessing
+import pathlib
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+gi.require_version("GstPbutils", "1.0")
+
+from gi.repository import Gst, GLib, GObject, GstPbutils
+
+logger = logging.getLogger(__name__)
+
+# Stream metadata service for local media libraries.
+#
+# Files are inspected with GstPbutils.Discoverer in a pool of worker processes,
+# and the results (duration, per-stream codec, language and bitrate, stream
+# counts) are stored in an SQLite database keyed by path, mtime and size. A
+# refresh only discovers files that are new or changed since the last run.
+#
+# basic-tutorial-5.py reads its stream panel from this cache when the file has
+# been discovered, instead of querying tags on every tags-changed message.
+
+DB_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                       "gstreamer_examples", "metadata.sqlite")
+
+DISCOVER_TIMEOUT = 10 * Gst.SECOND
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    duration INTEGER,
+    n_video INTEGER,
+    n_audio INTEGER,
+    n_text INTEGER,
+    streams TEXT,
+    error TEXT
+)
+"""
+
+class MetadataCache:
+    def __init__(self, db_path=DB_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    # Returns the cached entry of `path`, or None if missing or out of date
+    def get(self, path):
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        row = self.db.execute("SELECT * FROM media WHERE path = ? AND mtime_ns = ? AND size = ?",
+                              (path, st.st_mtime_ns, st.st_size)).fetchone()
+        if row is None:
+            return None
+
+        entry = dict(row)
+        entry["streams"] = json.loads(entry["streams"] or "[]")
+        return entry
+
+    # Same as get() for a URI. Only file:// URIs are cached.
+    def get_uri(self, uri):
+        if not uri.startswith("file://"):
+            return None
+        return self.get(Gst.uri_get_location(uri))
+
+    def put(self, entry):
+        self.db.execute("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (entry["path"], entry["mtime_ns"], entry["size"], entry["duration"],
+                         entry["n_video"], entry["n_audio"], entry["n_text"],
+                         json.dumps(entry["streams"]), entry["error"]))
+
+    def forget(self, path):
+        self.db.execute("DELETE FROM media WHERE path = ?", (path,))
+        self.db.commit()
+
+    # Returns the paths that are missing from the cache or changed on disk. Files
+    # that no longer exist are left out, and their entries are removed.
+    def stale(self, paths):
+        known = {row["path"]: (row["mtime_ns"], row["size"])
+                 for row in self.db.execute("SELECT path, mtime_ns, size FROM media")}
+
+        stale = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # Nothing to discover, and the entry can only be wrong now
+                if path in known:
+                    self.forget(path)
+                continue
+            if known.get(path) != (st.st_mtime_ns, st.st_size):
+                stale.append(path)
+        return stale
+
+    # Remove the entries of files that no longer exist
+    def prune(self):
+        gone = [row["path"] for row in self.db.execute("SELECT path FROM media") if not os.path.exists(row["path"])]
+        self.db.executemany("DELETE FROM media WHERE path = ?", [(path,) for path in gone])
+        self.db.commit()
+        return len(gone)
+
+    # Discover the stale files among `paths` on `processes` workers and store the
+    # results. Returns the number of files discovered.
+    def refresh(self, paths, processes=None):
+        paths = self.stale([os.path.abspath(path) for path in paths])
+        if not paths:
+            return 0
+
+        count = 0
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes, initializer=discover_init) as pool:
+            for entry in pool.imap_unordered(discover_worker, paths, chunksize=8):
+                # Removed while the refresh was running
+                if entry is None:
+                    continue
+                self.put(entry)
+                count += 1
+                # Commit in batches so an interrupted refresh keeps most of its work
+                if count % 100 == 0:
+                    self.db.commit()
+
+        self.db.commit()
+        return count
+
+# One Discoverer per worker process, created by the pool initializer
+discoverer = None
+
+def discover_init():
+    global discoverer
+    Gst.init(None)
+    discoverer = GstPbutils.Discoverer.new(DISCOVER_TIMEOUT)
+
+def stream_entry(stream):
+    caps = stream.get_caps()
+    entry = {
+        "type": stream.get_stream_type_nick(),
+        "codec": GstPbutils.pb_utils_get_codec_description(caps) if caps else None,
+        "language": None,
+        "bitrate": None,
+    }
+
+    if isinstance(stream, GstPbutils.DiscovererAudioInfo):
+        entry["language"] = stream.get_language()
+        entry["bitrate"] = stream.get_bitrate() or None
+    elif isinstance(stream, GstPbutils.DiscovererVideoInfo):
+        entry["bitrate"] = stream.get_bitrate() or None
+    elif isinstance(stream, GstPbutils.DiscovererSubtitleInfo):
+        entry["language"] = stream.get_language()
+
+    return entry
+
+# Returns None if the file is gone
+def discover_worker(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    entry = {
+        "path": path,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "duration": None,
+        "n_video": 0,
+        "n_audio": 0,
+        "n_text": 0,
+        "streams": [],
+        "error": None,
+    }
+
+    try:
+        info = discoverer.discover_uri(Gst.filename_to_uri(path))
+    except GLib.Error as err:
+        entry["error"] = err.message
+        return entry
+
+    entry["duration"] = info.get_duration()
+    entry["n_video"] = len(info.get_video_streams())
+    entry["n_audio"] = len(info.get_audio_streams())
+    entry["n_text"] = len(info.get_subtitle_streams())
+    entry["streams"] = [stream_entry(stream)
+                        for stream in info.get_stream_list()
+                        if not isinstance(stream, GstPbutils.DiscovererContainerInfo)]
+    return entry
+
+def collect_paths(paths):
+    files = []
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            files.extend(str(p) for p in sorted(path.rglob("*")) if p.is_file())
+        else:
+            files.append(str(path))
+    return files
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Discover stream metadata of a media library into a cache")
+    parser.add_argument("paths", nargs="+", help="files or directories")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: cores)")
+    parser.add_argument("--db", default=DB_PATH, help="cache database")
+    parser.add_argument("--prune", action="store_true", help="drop entries of deleted files")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    cache = MetadataCache(args.db)
+
+    if args.prune:
+        logger.info("Pruned {0} entries".format(cache.prune()))
+
+    paths = collect_paths(args.paths)
+    start = time.perf_counter()
+    refreshed = cache.refresh(paths, args.processes)
+    elapsed = time.perf_counter() - start
+
+    logger.info("{0} files, {1} discovered in {2:.2f} s ({3:.1f} files/s), {4} up to date".format(
+        len(paths), refreshed, elapsed, refreshed / elapsed if elapsed else 0, len(paths) - refreshed))
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import argparse
+import threading
+import collections
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Pad-probe tracing of a running pipeline.
+#
+# Buffer probes are attached to every pad of every element, including elements
+# added later inside bins (playbin, uridecodebin, decodebin...) and pads added
+# dynamically, such as the ones handled by pad_added_handler in basic-tutorial-3.py.
+#
+# For an element that processes buffers on the calling thread, the time between
+# a buffer entering its sink pad and a buffer leaving its src pad on the same
+# thread is its processing time. For queues, the buffer leaves on another thread,
+# and the time it spent inside is the queue latency. Every buffer is counted for
+# the rates, but only one in `sample_every` is timed, to keep the overhead low.
+#
+# The timed buffers are exported as Chrome trace JSON (chrome://tracing or
+# ui.perfetto.dev), and snapshot() returns the per-element statistics.
+
+QUEUE_FACTORIES = ("queue", "queue2", "multiqueue")
+
+class ElementStats:
+    def __init__(self, name):
+        self.name = name
+        self.buffers = 0
+        self.last_buffers = 0
+        self.samples = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.queue_samples = 0
+        self.queue_total_ns = 0
+        self.queue_max_ns = 0
+
+class PadTracer:
+    def __init__(self, pipeline, sample_every=16, max_events=100000):
+        self.pipeline = pipeline
+        self.sample_every = sample_every
+        self.stats = {}
+        self.events = collections.deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.queues = {}
+        self.probes = []
+        self.started = time.perf_counter_ns()
+        self.last_snapshot = self.started
+        self.pid = 1
+
+        # Pick up everything that is added to the pipeline later on, at any depth
+        self.pipeline.connect("deep-element-added", self.element_added_cb)
+        self.attach_element(pipeline)
+        for element in self.iterate(pipeline.iterate_recurse()):
+            self.attach_element(element)
+
+    @staticmethod
+    def iterate(iterator):
+        return list(iterator)
+
+    def element_added_cb(self, bin, sub_bin, element):
+        self.attach_element(element)
+
+    # Called from streaming threads for elements added while playing
+    def attach_element(self, element):
+        with self.lock:
+            if element in self.stats:
+                return
+            self.stats[element] = ElementStats(element.get_name())
+
+        element.connect("pad-added", self.pad_added_cb)
+        for pad in self.iterate(element.iterate_pads()):
+            self.attach_pad(element, pad)
+
+    def pad_added_cb(self, element, pad):
+        self.attach_pad(element, pad)
+
+    def attach_pad(self, element, pad):
+        # Ghost pads only proxy the internal pads, which get their own probes
+        if isinstance(pad, Gst.GhostPad):
+            return
+
+        factory = element.get_factory()
+        is_queue = factory is not None and factory.get_name() in QUEUE_FACTORIES
+
+        probe_type = Gst.PadProbeType.BUFFER
+        if pad.get_direction() == Gst.PadDirection.SINK:
+            callback = self.queue_sink_cb if is_queue else self.sink_cb
+            if is_queue:
+                # A flush empties the queue, so its FIFO must be emptied as well
+                probe_type |= Gst.PadProbeType.EVENT_FLUSH
+        else:
+            callback = self.queue_src_cb if is_queue else self.src_cb
+
+        probe_id = pad.add_probe(probe_type, callback, element)
+        with self.lock:
+            self.probes.append((pad, probe_id))
+
+    # Remove all probes
+    def detach(self):
+        with self.lock:
+            probes, self.probes = self.probes, []
+        for pad, probe_id in probes:
+            pad.remove_probe(probe_id)
+
+    def sink_cb(self, pad, info, element):
+        stats = self.stats[element]
+        stats.buffers += 1
+
+        if stats.buffers % self.sample_every == 0:
+            pending = getattr(self.local, "pending", None)
+            if pending is None:
+                pending = self.local.pending = {}
+            pending[element] = time.perf_counter_ns()
+
+        return Gst.PadProbeReturn.OK
+
+    def src_cb(self, pad, info, element):
+        pending = getattr(self.local, "pending", None)
+        if not pending:
+            return Gst.PadProbeReturn.OK
+
+        start = pending.pop(element, None)
+        if start is not None:
+            self.record(element, start, time.perf_counter_ns(), "process")
+
+        return Gst.PadProbeReturn.OK
+
+    # Queues hand buffers over to another thread in FIFO order, one FIFO per
+    # sink/src pair (multiqueue pads are named sink_N/src_N). The two ends run on
+    # different threads, so the FIFOs are only used with the lock held.
+    @staticmethod
+    def queue_key(element, pad):
+        name = pad.get_name()
+        return element, name.rsplit("_", 1)[1] if "_" in name else ""
+
+    def queue_sink_cb(self, pad, info, element):
+        key = self.queue_key(element, pad)
+
+        if info.type & Gst.PadProbeType.EVENT_FLUSH:
+            if info.get_event().type == Gst.EventType.FLUSH_STOP:
+                with self.lock:
+                    fifo = self.queues.get(key)
+                    if fifo is not None:
+                        fifo.clear()
+            return Gst.PadProbeReturn.OK
+
+        stats = self.stats[element]
+        stats.buffers += 1
+
+        sampled = stats.buffers % self.sample_every == 0
+        start = time.perf_counter_ns() if sampled else None
+        with self.lock:
+            fifo = self.queues.get(key)
+            if fifo is None:
+                fifo = self.queues[key] = collections.deque()
+            fifo.append(start)
+
+        return Gst.PadProbeReturn.OK
+
+    def queue_src_cb(self, pad, info, element):
+        key = self.queue_key(element, pad)
+        with self.lock:
+            fifo = self.queues.get(key)
+            # Empty after a flush, the buffers it held were never timed
+            start = fifo.popleft() if fifo else None
+
+        if start is not None:
+            self.record(element, start, time.perf_counter_ns(), "queue")
+
+        return Gst.PadProbeReturn.OK
+
+    def record(self, element, start, end, category):
+        duration = end - start
+        stats = self.stats[element]
+
+        with self.lock:
+            if category == "queue":
+                stats.queue_samples += 1
+                stats.queue_total_ns += duration
+                stats.queue_max_ns = max(stats.queue_max_ns, duration)
+            else:
+                stats.samples += 1
+                stats.total_ns += duration
+                stats.max_ns = max(stats.max_ns, duration)
+
+            self.events.append({
+                "name": stats.name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.started) / 1000,
+                "dur": duration / 1000,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+            })
+
+    # Per-element statistics since the previous snapshot, sorted by total
+    # sampled processing time (the hottest element first)
+    def snapshot(self):
+        now = time.perf_counter_ns()
+        interval = (now - self.last_snapshot) / 1e9 or 1e-9
+        self.last_snapshot = now
+
+        result = []
+        with self.lock:
+            for stats in self.stats.values():
+                if not stats.buffers:
+                    continue
+
+                rate = (stats.buffers - stats.last_buffers) / interval
+                stats.last_buffers = stats.buffers
+                result.append({
+                    "element": stats.name,
+                    "buffers": stats.buffers,
+                    "buffers_per_second": rate,
+                    "process_mean_us": stats.total_ns / stats.samples / 1000 if stats.samples else None,
+                    "process_max_us": stats.max_ns / 1000 if stats.samples else None,
+                    "queue_mean_us": stats.queue_total_ns / stats.queue_samples / 1000 if stats.queue_samples else None,
+                    "queue_max_us": stats.queue_max_ns / 1000 if stats.queue_samples else None,
+                    # Estimated from the samples, scaled back to all buffers
+                    "process_share": stats.total_ns * self.sample_every,
+                })
+
+        result.sort(key=lambda s: s["process_share"], reverse=True)
+        return result
+
+    # Log a snapshot every `interval` seconds from the GLib main loop
+    def log_periodically(self, interval=5):
+        def timeout_cb():
+            for stats in self.snapshot()[:10]:
+                logger.info("{0:24s} {1:9.1f} buf/s  process {2}  queue {3}".format(
+                    stats["element"], stats["buffers_per_second"],
+                    format_us(stats["process_mean_us"]), format_us(stats["queue_mean_us"])))
+            return True
+
+        return GLib.timeout_add_seconds(interval, timeout_cb)
+
+    def write_chrome_trace(self, path):
+        with self.lock:
+            events = list(self.events)
+
+        # Name the threads after the elements that ran on them
+        names = {}
+        for event in events:
+            if event["cat"] == "process":
+                names.setdefault(event["tid"], event["name"])
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                     "args": {"name": "streaming thread ({0})".format(name)}}
+                    for tid, name in names.items()]
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+def format_us(value):
+    return "{0:9.1f} us".format(value) if value is not None else "        -   "
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace a pipeline with pad probes")
+    parser.add_argument("uri", help="URI to play")
+    parser.add_argument("--playbin", action="store_true",
+                        help="trace a playbin (basic-tutorial-4.py) instead of the basic-tutorial-3.py graph")
+    parser.add_argument("--sample-every", type=int, default=16, help="time one buffer in N")
+    parser.add_argument("--interval", type=int, default=5, help="seconds between stats snapshots")
+    parser.add_argument("-o", "--output", default="trace.json", help="Chrome trace output")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+
+    if args.playbin:
+        pipeline = Gst.ElementFactory.make("playbin", "playbin")
+        pipeline.set_property("uri", args.uri)
+    else:
+        pipeline = Gst.parse_launch(
+            "uridecodebin name=source uri={0} ! audioconvert name=convert ! audioresample name=resample ! "
+            "autoaudiosink name=sink".format(args.uri))
+
+    tracer = PadTracer(pipeline, args.sample_every)
+    tracer.log_periodically(args.interval)
+
+    loop = GLib.MainLoop()
+
+    def bus_cb(bus, msg):
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            logger.error("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+            loop.quit()
+        elif msg.type == Gst.MessageType.EOS:
+            loop.quit()
+        return True
+
+    pipeline.get_bus().add_watch(GLib.PRIORITY_DEFAULT, bus_cb)
+    pipeline.set_state(Gst.State.PLAYING)
+
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+
+    pipeline.set_state(Gst.State.NULL)
+    tracer.write_chrome_trace(args.output)
+    logger.info("Wrote {0}".format(args.output))
+
+if __name__ == "__main__":
+    main()
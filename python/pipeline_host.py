@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import pathlib
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Runs many uridecodebin -> audioconvert -> audioresample -> fakesink pipelines
+# (the basic-tutorial-3.py graph) on a single GLib main loop per process, and
+# shards a batch of files across a process pool sized to the number of cores.
+#
+# Every pipeline gets a bus watch on the shared main loop instead of its own
+# blocking timed_pop_filtered loop, so one process can keep many decoders busy.
+
+class PipelineEntry:
+    def __init__(self, index, uri):
+        self.index = index
+        self.uri = uri
+        self.pipeline = None
+        self.source = None
+        self.convert = None
+        self.resample = None
+        self.sink = None
+        self.watch_id = None
+        # One of "pending", "running", "done" or "error"
+        self.state = "pending"
+        self.started = None
+        self.finished = None
+        self.duration = Gst.CLOCK_TIME_NONE
+        self.error = None
+
+    def result(self):
+        return {
+            "uri": self.uri,
+            "state": self.state,
+            "duration": self.duration if self.duration != Gst.CLOCK_TIME_NONE else None,
+            "elapsed": (self.finished - self.started) if self.finished else None,
+            "error": self.error,
+        }
+
+class PipelineHost:
+    def __init__(self, uris, max_in_flight=16):
+        self.loop = GLib.MainLoop()
+        self.max_in_flight = max_in_flight
+        # The per-pipeline state table
+        self.entries = [PipelineEntry(i, uri) for i, uri in enumerate(uris)]
+        self.pending = list(reversed(self.entries))
+        self.running = 0
+
+    def run(self):
+        if not self.entries:
+            return []
+
+        GLib.idle_add(self.fill)
+        self.loop.run()
+
+        return [entry.result() for entry in self.entries]
+
+    # Start pending pipelines until we reach the in-flight limit
+    def fill(self):
+        while self.pending and self.running < self.max_in_flight:
+            self.start(self.pending.pop())
+
+        if not self.pending and self.running == 0:
+            self.loop.quit()
+
+        return False
+
+    def start(self, entry):
+        entry.pipeline = Gst.Pipeline.new("pipeline-{0}".format(entry.index))
+        entry.source = Gst.ElementFactory.make("uridecodebin", "source")
+        entry.convert = Gst.ElementFactory.make("audioconvert", "convert")
+        entry.resample = Gst.ElementFactory.make("audioresample", "resample")
+        entry.sink = Gst.ElementFactory.make("fakesink", "sink")
+
+        if not entry.source or not entry.convert or not entry.resample or not entry.sink:
+            self.finish(entry, "error", "Not all elements could be created.")
+            return
+
+        entry.sink.set_property("sync", False)
+        entry.source.set_property("uri", entry.uri)
+
+        entry.pipeline.add(entry.source)
+        entry.pipeline.add(entry.convert)
+        entry.pipeline.add(entry.resample)
+        entry.pipeline.add(entry.sink)
+        if not entry.convert.link(entry.resample) or not entry.resample.link(entry.sink):
+            self.finish(entry, "error", "Elements could not be linked.")
+            return
+
+        entry.source.connect("pad-added", pad_added_handler, entry)
+
+        bus = entry.pipeline.get_bus()
+        entry.watch_id = bus.add_watch(GLib.PRIORITY_DEFAULT, self.bus_cb, entry)
+
+        entry.state = "running"
+        entry.started = time.perf_counter()
+        self.running += 1
+
+        ret = entry.pipeline.set_state(Gst.State.PLAYING)
+        if ret == Gst.StateChangeReturn.FAILURE:
+            self.finish(entry, "error", "Unable to set the pipeline to the playing state.")
+
+    # This function is called from the main loop for every message of every pipeline
+    def bus_cb(self, bus, msg, entry):
+        if msg.type & (Gst.MessageType.ERROR | Gst.MessageType.EOS):
+            # Returning False removes the watch
+            entry.watch_id = None
+
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            self.finish(entry, "error", "{0}: {1}".format(msg.src.get_name(), err.message))
+            return False
+        elif msg.type == Gst.MessageType.EOS:
+            self.finish(entry, "done")
+            return False
+
+        return True
+
+    def finish(self, entry, state, error=None):
+        if entry.state in ("done", "error"):
+            return
+
+        if entry.state == "running":
+            self.running -= 1
+            ret, duration = entry.pipeline.query_duration(Gst.Format.TIME)
+            if ret:
+                entry.duration = duration
+
+        entry.state = state
+        entry.error = error
+        entry.finished = time.perf_counter()
+        if error:
+            logger.error("{0}: {1}".format(entry.uri, error))
+
+        if entry.watch_id is not None:
+            GLib.source_remove(entry.watch_id)
+            entry.watch_id = None
+
+        # Drop all references so the pipeline is freed right away
+        if entry.pipeline:
+            entry.pipeline.set_state(Gst.State.NULL)
+        entry.pipeline = entry.source = entry.convert = entry.resample = entry.sink = None
+
+        GLib.idle_add(self.fill)
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, entry):
+    sink_pad = entry.convert.get_static_pad("sink")
+
+    # If our converter is already linked, we have nothing to do here
+    if sink_pad.is_linked():
+        return
+
+    # Check the new pad's type
+    new_pad_caps = new_pad.get_current_caps()
+    new_pad_type = new_pad_caps.get_structure(0).get_name()
+
+    if not new_pad_type.startswith("audio/x-raw"):
+        return
+
+    ret = new_pad.link(sink_pad)
+    if not ret == Gst.PadLinkReturn.OK:
+        logger.error("{0}: type is {1:s} but link failed".format(entry.uri, new_pad_type))
+
+# Runs one shard in a worker process
+def host_worker(uris, max_in_flight):
+    Gst.init(None)
+    return PipelineHost(uris, max_in_flight).run()
+
+# Decode all URIs, sharded round-robin over `processes` worker processes.
+# Returns the per-file results in input order.
+def run_sharded(uris, processes=None, max_in_flight=16):
+    processes = min(processes or os.cpu_count(), len(uris)) or 1
+    shards = [uris[i::processes] for i in range(processes)]
+
+    # Use spawn so that no worker inherits GStreamer state through fork
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        shard_results = pool.starmap(host_worker, [(shard, max_in_flight) for shard in shards])
+
+    results = [None] * len(uris)
+    for i, shard_result in enumerate(shard_results):
+        for j, result in enumerate(shard_result):
+            results[i + j * processes] = result
+
+    return results
+
+def collect_uris(paths):
+    uris = []
+    for path in paths:
+        if "://" in path:
+            uris.append(path)
+            continue
+
+        path = pathlib.Path(path)
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        uris.extend(p.resolve().as_uri() for p in files)
+
+    return uris
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a batch of files on a multi-process pipeline host")
+    parser.add_argument("paths", nargs="+", help="files, directories or URIs")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: cores)")
+    parser.add_argument("-n", "--max-in-flight", type=int, default=16, help="concurrent pipelines per process")
+    args = parser.parse_args()
+
+    uris = collect_uris(args.paths)
+    if not uris:
+        logger.error("No input files.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = run_sharded(uris, args.processes, args.max_in_flight)
+    elapsed = time.perf_counter() - start
+
+    done = [r for r in results if r["state"] == "done"]
+    media = sum(r["duration"] or 0 for r in done) / Gst.SECOND
+
+    logger.info("{0} files ({1} ok, {2} failed) in {3:.2f} s".format(
+        len(results), len(done), len(results) - len(done), elapsed))
+    logger.info("{0:.1f} files/s, realtime factor {1:.1f}x".format(
+        len(results) / elapsed, media / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import time
+import argparse
+import threading
+import contextlib
+import statistics
+import logging
+
+import player_core
+from player_core import Gst, GLib, PlayerCore
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# A pool of warm playbin pipelines for request-driven work (previews, short clips).
+#
+# Every tutorial builds a new playbin per run and takes it from NULL to PLAYING.
+# The pool keeps up to `size` playbins with their sinks already created and in
+# READY, so element creation, plugin loading and opening the sinks are paid once.
+# A request leases a pipeline, sets its URI and plays it; on return the pipeline is
+# taken back to READY, which tears down the per-URI decoding chain but keeps the
+# rest, and its bus is flushed.
+#
+# A returned pipeline that posted an error, fails to reach READY or has served
+# max_uses requests is discarded and replaced. Pipelines idle for more than
+# max_idle seconds are closed, down to min_size, on every acquire() and release(),
+# and by a timer on the default GLib main context for applications that run a
+# main loop.
+
+class PooledPipeline:
+    def __init__(self, make_sink):
+        self.playbin = Gst.ElementFactory.make("playbin", None)
+        if not self.playbin:
+            raise RuntimeError("Not all elements could be created.")
+
+        self.uses = 0
+        self.last_used = time.monotonic()
+        self.started = None
+        self.first_buffer_time = None
+        self.first_buffer = threading.Event()
+
+        for prop, name in (("video-sink", "videosink"), ("audio-sink", "audiosink")):
+            sink = make_sink(name)
+            # The probe stays for the life of the pipeline and is re-armed per lease
+            sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.first_buffer_cb)
+            self.playbin.set_property(prop, sink)
+
+    def first_buffer_cb(self, pad, info):
+        if self.first_buffer_time is None and self.started is not None:
+            self.first_buffer_time = time.perf_counter() - self.started
+            self.first_buffer.set()
+        return Gst.PadProbeReturn.OK
+
+    def set_uri(self, uri):
+        self.playbin.set_property("uri", uri)
+        self.started = None
+        self.first_buffer_time = None
+        self.first_buffer.clear()
+
+    def set_state(self, state):
+        if state == Gst.State.PLAYING and self.started is None:
+            self.started = time.perf_counter()
+        return self.playbin.set_state(state)
+
+    def play(self):
+        return self.set_state(Gst.State.PLAYING)
+
+    # Back to READY with an empty bus. Returns False if the pipeline is unusable.
+    def reset(self):
+        bus = self.playbin.get_bus()
+        healthy = bus.pop_filtered(Gst.MessageType.ERROR) is None
+
+        if self.playbin.set_state(Gst.State.READY) == Gst.StateChangeReturn.FAILURE:
+            healthy = False
+        else:
+            ret, state, pending = self.playbin.get_state(Gst.SECOND)
+            healthy = healthy and ret == Gst.StateChangeReturn.SUCCESS and state == Gst.State.READY
+
+        bus.set_flushing(True)
+        bus.set_flushing(False)
+        return healthy
+
+    def close(self):
+        self.playbin.set_state(Gst.State.NULL)
+
+def make_fakesink(name):
+    sink = Gst.ElementFactory.make("fakesink", name)
+    sink.set_property("sync", False)
+    return sink
+
+class PipelinePool:
+    def __init__(self, size=4, min_size=1, max_idle=60.0, max_uses=100, make_sink=make_fakesink):
+        player_core.init()
+
+        self.size = size
+        self.min_size = min_size
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.make_sink = make_sink
+        self.condition = threading.Condition()
+        # Idle pipelines, most recently returned last
+        self.idle = []
+        self.leased = 0
+        self.created = 0
+        self.replaced = 0
+        self.evicted = 0
+
+        for i in range(size):
+            pipeline = self.create()
+            if pipeline is not None:
+                self.idle.append(pipeline)
+
+        # Pipelines go stale no later than max_idle / 2 after their time is up
+        self.evict_id = GLib.timeout_add_seconds(max(1, int(max_idle / 2)), self.evict_cb)
+
+    def create(self):
+        pipeline = PooledPipeline(self.make_sink)
+        if pipeline.reset():
+            with self.condition:
+                self.created += 1
+            return pipeline
+
+        logger.error("New pipeline could not reach READY.")
+        pipeline.close()
+        return None
+
+    def total(self):
+        return len(self.idle) + self.leased
+
+    # Lease a pipeline with `uri` set, waiting up to `timeout` seconds for one to be
+    # returned if all `size` pipelines are in use
+    def acquire(self, uri, timeout=None):
+        with self.condition:
+            self.evict_idle()
+            if not self.condition.wait_for(lambda: self.idle or self.total() < self.size, timeout):
+                raise TimeoutError("No pipeline available.")
+
+            pipeline = self.idle.pop() if self.idle else None
+            self.leased += 1
+
+        if pipeline is None:
+            pipeline = self.create()
+            if pipeline is None:
+                with self.condition:
+                    self.leased -= 1
+                    self.condition.notify()
+                raise RuntimeError("Could not create a pipeline.")
+
+        pipeline.uses += 1
+        pipeline.set_uri(uri)
+        return pipeline
+
+    def release(self, pipeline):
+        healthy = pipeline.reset()
+        if not healthy or pipeline.uses >= self.max_uses:
+            if not healthy:
+                logger.warning("Replacing unhealthy pipeline {0}".format(pipeline.playbin.get_name()))
+            pipeline.close()
+            pipeline = self.create()
+            with self.condition:
+                self.replaced += 1
+
+        with self.condition:
+            self.leased -= 1
+            if pipeline is not None:
+                pipeline.last_used = time.monotonic()
+                self.idle.append(pipeline)
+            self.evict_idle()
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def lease(self, uri, timeout=None):
+        pipeline = self.acquire(uri, timeout)
+        try:
+            yield pipeline
+        finally:
+            self.release(pipeline)
+
+    def evict_cb(self):
+        with self.condition:
+            self.evict_idle()
+        return True
+
+    # Close pipelines idle for more than max_idle seconds, oldest first, keeping at
+    # least min_size. Called with the condition held.
+    def evict_idle(self):
+        now = time.monotonic()
+        while self.idle and self.total() > self.min_size and now - self.idle[0].last_used > self.max_idle:
+            self.idle.pop(0).close()
+            self.evicted += 1
+
+    def close(self):
+        if self.evict_id is not None:
+            GLib.source_remove(self.evict_id)
+            self.evict_id = None
+
+        with self.condition:
+            for pipeline in self.idle:
+                pipeline.close()
+            self.idle = []
+
+# Play `uri` until the first buffer reaches a sink. Returns the time it took.
+def first_buffer_pooled(pool, uri, timeout=10):
+    with pool.lease(uri) as pipeline:
+        pipeline.play()
+        if not pipeline.first_buffer.wait(timeout):
+            raise RuntimeError("No buffer within {0} s".format(timeout))
+        return pipeline.first_buffer_time
+
+# Same for a new pipeline. The time includes building it, which is what the pool
+# saves.
+def first_buffer_fresh(uri, timeout=10):
+    begin = time.perf_counter()
+    core = PlayerCore(uri, headless=True)
+    core.play()
+    deadline = time.perf_counter() + timeout
+    while core.first_buffer_time is None:
+        if time.perf_counter() > deadline:
+            raise RuntimeError("No buffer within {0} s".format(timeout))
+        time.sleep(0.001)
+    core.close()
+    # first_buffer_time counts from the switch to PLAYING
+    return core.started - begin + core.first_buffer_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-buffer with and without a warm pipeline pool")
+    parser.add_argument("uri", nargs="?", help="URI to play, default: the benchmark media")
+    parser.add_argument("--requests", type=int, default=50, help="requests per variant")
+    parser.add_argument("--size", type=int, default=4, help="pool size")
+    args = parser.parse_args()
+
+    player_core.init()
+    uri = args.uri
+    if uri is None:
+        from bench_tutorials import generate_media
+        uri = Gst.filename_to_uri(generate_media())
+
+    fresh = [first_buffer_fresh(uri) for i in range(args.requests)]
+
+    start = time.perf_counter()
+    pool = PipelinePool(args.size)
+    logger.info("Pool of {0} pipelines warmed up in {1:.1f} ms".format(args.size, (time.perf_counter() - start) * 1000))
+    pooled = [first_buffer_pooled(pool, uri) for i in range(args.requests)]
+    pool.close()
+
+    for name, times in (("fresh", fresh), ("pooled", pooled)):
+        logger.info("{0:6s} first buffer median {1:7.2f} ms  p95 {2:7.2f} ms".format(
+            name, statistics.median(times) * 1000, sorted(times)[int(len(times) * 0.95) - 1] * 1000))
+    logger.info("Pool created {0}, replaced {1}, evicted {2}".format(pool.created, pool.replaced, pool.evicted))
+
+if __name__ == "__main__":
+    main()
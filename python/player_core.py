@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logger = logging.getLogger(__name__)
+
+# Shared player core for the tutorials and the headless tools.
+#
+# Importing this module only loads the GLib/GObject/Gst bindings. GStreamer itself
+# is initialized on first use, and the GTK/GL bindings (Gtk, GdkX11, GstVideo) are
+# only imported when a GUI frontend asks for them with load_gui(), so the same core
+# runs on a machine without a display.
+#
+# Plugins are loaded by GStreamer when an element of theirs is first created. What
+# costs time at init is the registry check, which stats every plugin file and may
+# spawn the plugin scanner; init(update_registry=False) skips it for batch jobs
+# that know the installed plugins did not change.
+
+def init(update_registry=True):
+    if Gst.is_initialized():
+        return
+
+    if not update_registry:
+        os.environ.setdefault("GST_REGISTRY_UPDATE", "no")
+    # Leave only the arguments GStreamer did not consume, like gst_init() does
+    sys.argv[:] = Gst.init(sys.argv)
+
+# Import the GUI bindings and initialize GTK. Returns the Gtk module, or None if
+# there is no display to connect to.
+def load_gui():
+    gi.require_version("Gtk", "3.0")
+    gi.require_version("GdkX11", "3.0")
+    gi.require_version("GstVideo", "1.0")
+
+    from gi.repository import Gtk, GdkX11, GstVideo
+
+    ret, argv = Gtk.init_check(sys.argv)
+    if not ret:
+        return None
+    return Gtk
+
+# Runs a playbin, or with `pipeline` a pipeline built by the caller, in which
+# case the uri and sink arguments are not used.
+class PlayerCore:
+    def __init__(self, uri=None, video_sink=None, audio_sink=None, headless=False, pipeline=None):
+        init()
+
+        if pipeline is not None:
+            self.pipeline = pipeline
+            self.playbin = None
+        else:
+            self.pipeline = self.playbin = Gst.ElementFactory.make("playbin", "playbin")
+            if not self.playbin:
+                raise RuntimeError("Not all elements could be created.")
+
+        self.state = Gst.State.NULL
+        self.duration = Gst.CLOCK_TIME_NONE
+        self.seek_enabled = False
+        self.first_buffer_time = None
+        self.started = None
+        self.loop = None
+        self.handlers = {}
+
+        if self.playbin is not None:
+            if headless:
+                # Decode as fast as possible without any output device
+                video_sink = video_sink or self.make_fakesink("videosink")
+                audio_sink = audio_sink or self.make_fakesink("audiosink")
+
+            if video_sink is not None:
+                self.playbin.set_property("video-sink", video_sink)
+            if audio_sink is not None:
+                self.playbin.set_property("audio-sink", audio_sink)
+            if uri is not None:
+                self.playbin.set_property("uri", uri)
+
+        # Instruct the bus to emit signals for each received message. The generic
+        # handler is connected first, so "message" callbacks run before the others.
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.message_cb)
+        bus.connect("message::error", self.error_cb)
+        bus.connect("message::eos", self.eos_cb)
+        bus.connect("message::state-changed", self.state_changed_cb)
+        bus.connect("message::duration-changed", self.duration_changed_cb)
+        bus.connect("message::async-done", self.async_done_cb)
+        bus.connect("message::application", self.application_cb)
+
+    def make_fakesink(self, name):
+        sink = Gst.ElementFactory.make("fakesink", name)
+        sink.set_property("sync", False)
+        sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.first_buffer_cb)
+        return sink
+
+    def first_buffer_cb(self, pad, info):
+        if self.first_buffer_time is None and self.started is not None:
+            self.first_buffer_time = time.perf_counter() - self.started
+        return Gst.PadProbeReturn.REMOVE
+
+    # Register `callback(core, msg)` for "message" (every message), "error", "eos",
+    # "state-changed" (pipeline only), "duration-changed", "async-done" or
+    # "application" messages
+    def connect(self, name, callback):
+        self.handlers.setdefault(name, []).append(callback)
+
+    def emit(self, name, msg):
+        for callback in self.handlers.get(name, ()):
+            callback(self, msg)
+
+    def set_uri(self, uri):
+        self.playbin.set_property("uri", uri)
+
+    def set_state(self, state):
+        if state == Gst.State.PLAYING and self.started is None:
+            self.started = time.perf_counter()
+
+        ret = self.pipeline.set_state(state)
+        if ret == Gst.StateChangeReturn.FAILURE:
+            logger.error("Unable to set the pipeline to the {0} state.".format(Gst.Element.state_get_name(state)))
+        return ret
+
+    def play(self):
+        return self.set_state(Gst.State.PLAYING)
+
+    def pause(self):
+        return self.set_state(Gst.State.PAUSED)
+
+    def stop(self):
+        return self.set_state(Gst.State.READY)
+
+    def query_duration(self):
+        if self.duration == Gst.CLOCK_TIME_NONE:
+            ret, duration = self.pipeline.query_duration(Gst.Format.TIME)
+            if ret:
+                self.duration = duration
+        return self.duration
+
+    def message_cb(self, bus, msg):
+        self.emit("message", msg)
+
+    def error_cb(self, bus, msg):
+        err, debug_info = msg.parse_error()
+        logger.error("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+        self.emit("error", msg)
+
+        if self.loop is not None:
+            self.loop.quit()
+
+    def eos_cb(self, bus, msg):
+        logger.info("End-Of-Stream reached.")
+        self.emit("eos", msg)
+
+        if self.loop is not None:
+            self.loop.quit()
+
+    def state_changed_cb(self, bus, msg):
+        if msg.src != self.pipeline:
+            return
+
+        old_state, new_state, pending_state = msg.parse_state_changed()
+        self.state = new_state
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("State changed from %s to %s",
+                         Gst.Element.state_get_name(old_state),
+                         Gst.Element.state_get_name(new_state))
+
+        if new_state == Gst.State.PLAYING:
+            query = Gst.Query.new_seeking(Gst.Format.TIME)
+            if self.pipeline.query(query):
+                fmt, self.seek_enabled, start, end = query.parse_seeking()
+
+        self.emit("state-changed", msg)
+
+    def duration_changed_cb(self, bus, msg):
+        self.duration = Gst.CLOCK_TIME_NONE
+        self.emit("duration-changed", msg)
+
+    def async_done_cb(self, bus, msg):
+        self.emit("async-done", msg)
+
+    def application_cb(self, bus, msg):
+        self.emit("application", msg)
+
+    # Play until EOS or error on a GLib main loop. Returns the result of the
+    # change to PLAYING.
+    def run(self):
+        self.loop = GLib.MainLoop()
+        ret = self.play()
+        if ret != Gst.StateChangeReturn.FAILURE:
+            self.loop.run()
+        self.loop = None
+        self.close()
+        return ret
+
+    def close(self):
+        self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline.get_bus().remove_signal_watch()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import time
+import argparse
+import gi
+import logging
+
+import player_core
+from player_core import Gst, GLib, GObject
+
+gi.require_version("GstBase", "1.0")
+
+from gi.repository import GstBase
+
+logger = logging.getLogger(__name__)
+
+# Playback position without a position query per read.
+#
+# refresh_ui in basic-tutorial-5.py and the polling loop of basic-tutorial-4.py
+# query the position (and, until known, the duration) on every tick. A position
+# query travels down to the sinks and back. While PLAYING, a sink computes the
+# answer from values that only change on specific events:
+#
+#   running time = clock time - base time - latency
+#   position     = stream time of that running time in the current segment
+#
+# The tracker keeps those values in an anchor tuple and does the same computation
+# itself. The anchor is replaced, never modified, so a read is a single attribute
+# load plus the clock read and two segment conversions, without locks.
+#
+# The anchor is rebuilt with a real query on state changes, ASYNC_DONE (a seek or
+# preroll finished), NEW_CLOCK and LATENCY messages, and its segment is replaced
+# by a pad probe on the sinks when a new segment (seek, rate change, next item)
+# arrives. Between a flush and the next resync the position is frozen. The
+# duration is queried once and cached until DURATION_CHANGED.
+
+class PositionTracker:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.state = Gst.State.NULL
+        self.cached_duration = Gst.CLOCK_TIME_NONE
+        self.probed_pads = set()
+        # (position, segment, clock, base time, latency). With no clock the position
+        # is frozen at `position`.
+        self.anchor = (0, None, None, 0, 0)
+        self.resyncs = 0
+
+    # Current position in nanoseconds
+    def position(self):
+        position, segment, clock, base_time, latency = self.anchor
+        if clock is None:
+            return position
+
+        running_time = clock.get_time() - base_time - latency
+        if running_time < 0:
+            return position
+
+        current = segment.position_from_running_time(Gst.Format.TIME, running_time)
+        if current == Gst.CLOCK_TIME_NONE:
+            return position
+        current = segment.to_stream_time(Gst.Format.TIME, current)
+        if current == Gst.CLOCK_TIME_NONE:
+            return position
+
+        duration = self.cached_duration
+        return min(current, duration) if duration != Gst.CLOCK_TIME_NONE else current
+
+    # Duration in nanoseconds, or Gst.CLOCK_TIME_NONE if still unknown
+    def duration(self):
+        if self.cached_duration == Gst.CLOCK_TIME_NONE:
+            ret, duration = self.pipeline.query_duration(Gst.Format.TIME)
+            if ret:
+                self.cached_duration = duration
+        return self.cached_duration
+
+    # Rebuild the anchor from a position query and the sinks' current segment
+    def resync(self):
+        self.resyncs += 1
+        position = self.anchor[0]
+        ret, current = self.pipeline.query_position(Gst.Format.TIME)
+        if ret:
+            position = current
+
+        segment = self.find_segment()
+        clock = self.pipeline.get_clock() if self.state == Gst.State.PLAYING else None
+        if clock is None or segment is None:
+            self.anchor = (position, segment, None, 0, 0)
+        else:
+            self.anchor = (position, segment, clock, self.pipeline.get_base_time(), self.pipeline.get_latency())
+
+    # Segment of the first sink that has one, probing new sinks on the way
+    def find_segment(self):
+        segment = None
+        for element in iterate(self.pipeline.iterate_recurse()):
+            if not isinstance(element, GstBase.BaseSink):
+                continue
+
+            pad = element.get_static_pad("sink")
+            if pad not in self.probed_pads:
+                self.probed_pads.add(pad)
+                pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM | Gst.PadProbeType.EVENT_FLUSH, self.event_probe_cb)
+
+            event = pad.get_sticky_event(Gst.EventType.SEGMENT, 0)
+            if segment is None and event is not None:
+                segment = event.parse_segment().copy()
+        return segment
+
+    # Called from the streaming threads
+    def event_probe_cb(self, pad, info):
+        event = info.get_event()
+        position, segment, clock, base_time, latency = self.anchor
+
+        if event.type == Gst.EventType.FLUSH_START:
+            # A flushing seek resets the running time, freeze until the resync
+            self.anchor = (self.position(), segment, None, 0, 0)
+        elif event.type == Gst.EventType.SEGMENT:
+            segment = event.parse_segment().copy()
+            if clock is None:
+                self.anchor = (segment.to_stream_time(Gst.Format.TIME, segment.start), segment, None, 0, 0)
+            else:
+                # Running time continues across a non-flushing segment
+                self.anchor = (position, segment, clock, base_time, latency)
+
+        return Gst.PadProbeReturn.OK
+
+    # Feed bus messages of the pipeline
+    def handle(self, msg):
+        if msg.type == Gst.MessageType.DURATION_CHANGED:
+            self.cached_duration = Gst.CLOCK_TIME_NONE
+        elif msg.type == Gst.MessageType.STATE_CHANGED:
+            if msg.src == self.pipeline:
+                old_state, self.state, pending_state = msg.parse_state_changed()
+                self.resync()
+        elif msg.type in (Gst.MessageType.ASYNC_DONE, Gst.MessageType.NEW_CLOCK, Gst.MessageType.LATENCY):
+            self.resync()
+
+    # Bus "message" signal handler, for bus.connect("message", tracker.message_cb)
+    def message_cb(self, bus, msg):
+        self.handle(msg)
+
+def iterate(iterator):
+    return list(iterator) if iterator is not None else []
+
+# Compares the tracked position with a real query while `uri` plays
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Compare the tracked position with position queries")
+    parser.add_argument("uri", help="URI to play")
+    parser.add_argument("--reads", type=int, default=10000, help="reads per method for the timing")
+    args = parser.parse_args()
+
+    player_core.init()
+    playbin = Gst.ElementFactory.make("playbin", "playbin")
+    playbin.set_property("uri", args.uri)
+    tracker = PositionTracker(playbin)
+
+    bus = playbin.get_bus()
+    bus.add_signal_watch()
+    bus.connect("message", tracker.message_cb)
+
+    loop = GLib.MainLoop()
+    bus.connect("message::eos", lambda bus, msg: loop.quit())
+    bus.connect("message::error", lambda bus, msg: loop.quit())
+
+    def report():
+        if tracker.state != Gst.State.PLAYING:
+            return True
+
+        ret, queried = playbin.query_position(Gst.Format.TIME)
+        tracked = tracker.position()
+        logger.info("tracked {0:.3f} s  queried {1:.3f} s  difference {2:+.2f} ms".format(
+            tracked / Gst.SECOND, queried / Gst.SECOND, (tracked - queried) / Gst.MSECOND))
+
+        start = time.perf_counter()
+        for i in range(args.reads):
+            tracker.position()
+        tracked_cost = (time.perf_counter() - start) / args.reads
+
+        start = time.perf_counter()
+        for i in range(args.reads):
+            playbin.query_position(Gst.Format.TIME)
+        queried_cost = (time.perf_counter() - start) / args.reads
+
+        logger.info("read {0:.2f} us tracked, {1:.2f} us queried, {2} resyncs".format(
+            tracked_cost * 1e6, queried_cost * 1e6, tracker.resyncs))
+        return True
+
+    GLib.timeout_add_seconds(1, report)
+    playbin.set_state(Gst.State.PLAYING)
+    loop.run()
+    playbin.set_state(Gst.State.NULL)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import time
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logger = logging.getLogger(__name__)
+
+# Coalesces bursts of seek requests so that only one flushing seek is in flight.
+#
+# Dragging a slider emits value-changed many times per second. Instead of issuing a
+# flushing seek for each of them, we issue the first one and only remember the
+# latest target for the others. When the pipeline posts ASYNC_DONE (the seek has
+# completed and the first frame has prerolled), the latest pending target, if any,
+# is issued. The ASYNC_DONE that completes a flushing seek carries the seek event's
+# sequence number, so completions of state changes or of seeks forgotten by a
+# reset() are told apart from the one we wait for.
+#
+# If a KeyframeIndex is given, targets are snapped to a known keyframe and sought
+# with ACCURATE, so neither the demuxer index lookup nor decoding up to the target
+# is needed. Otherwise KEY_UNIT | SNAP_BEFORE is used.
+
+class SeekScheduler:
+    def __init__(self, pipeline, index=None):
+        self.pipeline = pipeline
+        self.index = index
+        self.pending = None
+        self.in_flight = False
+        self.seqnum = None
+        self.issued_at = None
+        # Seek-to-first-frame latency of the last completed seek, in seconds
+        self.last_latency = None
+        self.issued = 0
+        self.coalesced = 0
+
+    # Request a seek to `position` (in nanoseconds)
+    def request(self, position):
+        if self.in_flight:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = position
+            return
+
+        self.issue(position)
+
+    def issue(self, position):
+        if self.index is not None and len(self.index):
+            target = self.index.keyframe_before(position)
+            flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+        else:
+            target = position
+            flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE
+
+        event = Gst.Event.new_seek(1.0, Gst.Format.TIME, flags,
+                                   Gst.SeekType.SET, target, Gst.SeekType.NONE, -1)
+        self.seqnum = event.get_seqnum()
+        self.issued_at = time.perf_counter()
+        if not self.pipeline.send_event(event):
+            logger.error("Seek to {0} failed.".format(target))
+            self.in_flight = False
+            self.seqnum = None
+            return
+
+        self.issued += 1
+        self.in_flight = True
+
+    # Connect this to "message::async-done" on the pipeline bus
+    def async_done_cb(self, bus, msg):
+        # Only the completion of the seek in flight
+        if not self.in_flight or msg.get_seqnum() != self.seqnum:
+            return
+
+        self.in_flight = False
+        self.last_latency = time.perf_counter() - self.issued_at
+
+        if self.pending is not None:
+            position, self.pending = self.pending, None
+            self.issue(position)
+
+    # Forget about the in-flight and pending seeks, e.g. after an error or a stop
+    def reset(self):
+        self.in_flight = False
+        self.pending = None
+        self.seqnum = None
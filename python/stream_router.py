@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import logging
+
+import player_core
+from player_core import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Routes every stream of a uridecodebin to its own processing branch.
+#
+# pad_added_handler in basic-tutorial-3.py links the first raw audio pad and
+# ignores all the others, although uridecodebin has already decoded them. The
+# router instead builds a branch for each new pad, according to its caps type:
+#
+#   audio:     queue ! audioconvert ! audioresample ! sink
+#   video:     queue ! videoconvert ! sink
+#   subtitles: queue ! sink
+#
+# Each branch starts with a queue, so it runs on its own streaming thread. Stream
+# types we do not want are left out of uridecodebin's "caps" property with
+# expose-all-streams disabled, so they are never decoded in the first place.
+# All tracks of a file are processed in a single pass.
+
+KIND_CAPS = {
+    "audio": ["audio/x-raw(ANY)"],
+    "video": ["video/x-raw(ANY)"],
+    "subtitles": ["text/x-raw(ANY)", "subpicture/x-dvd", "subpicture/x-pgs"],
+}
+
+KIND_CONVERTERS = {
+    "audio": ["audioconvert", "audioresample"],
+    "video": ["videoconvert"],
+    "subtitles": [],
+}
+
+def caps_kind(caps):
+    name = caps.get_structure(0).get_name()
+    for kind, prefixes in KIND_CAPS.items():
+        if any(name == prefix.split("(")[0] for prefix in prefixes):
+            return kind
+    return None
+
+# Headless default: a fakesink that does not sync to the clock
+def default_sink_factory(kind, index):
+    sink = Gst.ElementFactory.make("fakesink", None)
+    sink.set_property("sync", False)
+    return sink
+
+class Branch:
+    def __init__(self, kind, index, pad, bin):
+        self.kind = kind
+        self.index = index
+        self.pad = pad
+        self.bin = bin
+        self.buffers = 0
+
+class StreamRouter:
+    def __init__(self, pipeline, source, kinds=("audio", "video", "subtitles"), sink_factory=default_sink_factory):
+        self.pipeline = pipeline
+        self.source = source
+        self.kinds = kinds
+        self.sink_factory = sink_factory
+        self.branches = {}
+        self.counts = {}
+
+        # Only decode the stream types we route
+        caps = "; ".join(c for kind in kinds for c in KIND_CAPS[kind])
+        source.set_property("caps", Gst.Caps.from_string(caps))
+        source.set_property("expose-all-streams", False)
+
+        source.connect("pad-added", self.pad_added_cb)
+        source.connect("pad-removed", self.pad_removed_cb)
+
+    def build_branch(self, kind, index):
+        bin = Gst.Bin.new("{0}-branch-{1}".format(kind, index))
+        queue = Gst.ElementFactory.make("queue", None)
+        elements = [queue] + [Gst.ElementFactory.make(name, None) for name in KIND_CONVERTERS[kind]]
+        elements.append(self.sink_factory(kind, index))
+
+        if not all(elements):
+            raise RuntimeError("Not all elements could be created for the {0} branch.".format(kind))
+
+        for element in elements:
+            bin.add(element)
+        for upstream, downstream in zip(elements, elements[1:]):
+            if not upstream.link(downstream):
+                raise RuntimeError("Elements could not be linked in the {0} branch.".format(kind))
+
+        bin.add_pad(Gst.GhostPad.new("sink", queue.get_static_pad("sink")))
+        return bin
+
+    # This function will be called by the pad-added signal, from a streaming thread
+    def pad_added_cb(self, src, new_pad):
+        caps = new_pad.get_current_caps() or new_pad.query_caps(None)
+        kind = caps_kind(caps)
+
+        if kind not in self.kinds:
+            logger.info("Pad '{0:s}' has type {1:s}. Ignoring.".format(
+                new_pad.get_name(), caps.get_structure(0).get_name()))
+            return
+
+        index = self.counts.get(kind, 0)
+        self.counts[kind] = index + 1
+
+        bin = self.build_branch(kind, index)
+        branch = Branch(kind, index, new_pad, bin)
+        bin.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.count_probe_cb, branch)
+
+        self.pipeline.add(bin)
+        bin.sync_state_with_parent()
+
+        ret = new_pad.link(bin.get_static_pad("sink"))
+        if not ret == Gst.PadLinkReturn.OK:
+            logger.error("Type is {0:s} but link failed".format(kind))
+            bin.set_state(Gst.State.NULL)
+            self.pipeline.remove(bin)
+            return
+
+        self.branches[new_pad] = branch
+        logger.info("Routed pad '{0:s}' to {1}".format(new_pad.get_name(), bin.get_name()))
+
+    def pad_removed_cb(self, src, pad):
+        branch = self.branches.pop(pad, None)
+        if branch is None:
+            return
+
+        branch.bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(branch.bin)
+
+    def count_probe_cb(self, pad, info, branch):
+        branch.buffers += 1
+        return Gst.PadProbeReturn.OK
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode all streams of a URI in one pass")
+    parser.add_argument("uri", help="URI to decode")
+    parser.add_argument("--kinds", default="audio,video,subtitles", help="stream types to route")
+    args = parser.parse_args()
+
+    player_core.init()
+
+    pipeline = Gst.Pipeline.new("router")
+    source = Gst.ElementFactory.make("uridecodebin", "source")
+    source.set_property("uri", args.uri)
+    pipeline.add(source)
+    router = StreamRouter(pipeline, source, tuple(args.kinds.split(",")))
+
+    if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+        logger.error("Unable to set the pipeline to the playing state.")
+        sys.exit(1)
+
+    msg = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        logger.error("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    for branch in router.branches.values():
+        logger.info("{0}: {1} buffers".format(branch.bin.get_name(), branch.buffers))
+
+    pipeline.set_state(Gst.State.NULL)
+
+if __name__ == "__main__":
+    main()
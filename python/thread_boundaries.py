@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import sys
+import time
+import resource
+import argparse
+import statistics
+import collections
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logger = logging.getLogger(__name__)
+
+# Thread boundaries for the post-decode chain of basic-tutorial-3.py.
+#
+# Linked back to back, convert, resample and sink all run on the decoder's
+# streaming thread. A queue element starts a new streaming thread on its src pad,
+# so inserting queues at chosen boundaries spreads the chain over several cores,
+# at the cost of the latency of the buffers held in each queue.
+#
+#   decode ! [queue] ! convert ! [queue] ! resample ! [queue] ! sink
+#
+# basic-tutorial-3.py builds its chain with build_audio_chain() and takes the
+# strategy with --queues. None of these elements has a thread-count property of
+# its own (n-threads exists on videoconvert and videoscale), so queues are the only
+# way to spread this chain.
+
+# Boundaries a queue can be inserted at, in chain order
+BOUNDARIES = ("decode", "convert", "resample")
+
+# Named placement strategies
+STRATEGIES = {
+    "none": (),
+    "after-decode": ("decode",),
+    "after-convert": ("convert",),
+    "decode+convert": ("decode", "convert"),
+    "all": ("decode", "convert", "resample"),
+}
+
+class QueueLimits:
+    def __init__(self, buffers=8, time=0, bytes=0):
+        # 0 disables a limit
+        self.buffers = buffers
+        self.time = time
+        self.bytes = bytes
+
+def make_queue(name, limits):
+    queue = Gst.ElementFactory.make("queue", name)
+    queue.set_property("max-size-buffers", limits.buffers)
+    queue.set_property("max-size-time", limits.time)
+    queue.set_property("max-size-bytes", limits.bytes)
+    return queue
+
+# Add convert -> resample -> sink to `pipeline`, with queues after the given
+# boundaries. Returns the element the decoder's pad has to be linked to.
+def build_audio_chain(pipeline, sink, boundaries=(), limits=None):
+    limits = limits or QueueLimits()
+    convert = Gst.ElementFactory.make("audioconvert", "convert")
+    resample = Gst.ElementFactory.make("audioresample", "resample")
+    if not convert or not resample:
+        raise RuntimeError("Not all elements could be created.")
+
+    # Each boundary is followed by the stage it feeds
+    chain = []
+    for boundary, stage in zip(BOUNDARIES, (convert, resample, sink)):
+        if boundary in boundaries:
+            chain.append(make_queue("queue-after-{0}".format(boundary), limits))
+        chain.append(stage)
+
+    for element in chain:
+        if element is not sink:
+            pipeline.add(element)
+
+    for upstream, downstream in zip(chain, chain[1:]):
+        if not upstream.link(downstream):
+            raise RuntimeError("Elements could not be linked.")
+
+    return chain[0]
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.entry = None
+        # (pts, time) of the buffers that left the decoder, oldest first
+        self.decoded = collections.deque()
+        self.latencies = []
+        self.buffers = 0
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, data):
+    sink_pad = data.entry.get_static_pad("sink")
+    if sink_pad.is_linked():
+        return
+
+    if new_pad.get_current_caps().get_structure(0).get_name().startswith("audio/x-raw"):
+        if new_pad.link(sink_pad) == Gst.PadLinkReturn.OK:
+            new_pad.add_probe(Gst.PadProbeType.BUFFER, decoded_probe_cb, data)
+
+# Remember when each buffer left the decoder, to measure the chain latency
+def decoded_probe_cb(pad, info, data):
+    pts = info.get_buffer().pts
+    if pts != Gst.CLOCK_TIME_NONE:
+        data.decoded.append((pts, time.perf_counter()))
+    return Gst.PadProbeReturn.OK
+
+# The converters may split or merge buffers, so a sink buffer is matched with the
+# decoded buffer its first sample came from: the last one starting at or before
+# its pts. Older entries can no longer match and are dropped.
+def sink_probe_cb(pad, info, data):
+    data.buffers += 1
+    pts = info.get_buffer().pts
+    if pts == Gst.CLOCK_TIME_NONE:
+        return Gst.PadProbeReturn.OK
+
+    decoded = data.decoded
+    while len(decoded) > 1 and decoded[1][0] <= pts:
+        decoded.popleft()
+    if decoded and decoded[0][0] <= pts:
+        data.latencies.append(time.perf_counter() - decoded[0][1])
+    return Gst.PadProbeReturn.OK
+
+# Decode `uri` to a fakesink with the given strategy and return its measurements
+def run_strategy(uri, boundaries, limits):
+    data = CustomData()
+    data.pipeline = Gst.Pipeline.new("boundaries")
+    source = Gst.ElementFactory.make("uridecodebin", "source")
+    sink = Gst.ElementFactory.make("fakesink", "sink")
+    sink.set_property("sync", False)
+    sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, sink_probe_cb, data)
+
+    data.pipeline.add(source)
+    data.pipeline.add(sink)
+    data.entry = build_audio_chain(data.pipeline, sink, boundaries, limits)
+
+    source.set_property("uri", uri)
+    source.connect("pad-added", pad_added_handler, data)
+
+    cpu = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    data.pipeline.set_state(Gst.State.PLAYING)
+    msg = data.pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    ret, duration = data.pipeline.query_duration(Gst.Format.TIME)
+    data.pipeline.set_state(Gst.State.NULL)
+
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    return {
+        "realtime_factor": duration / Gst.SECOND / elapsed if ret else None,
+        "buffers_per_second": data.buffers / elapsed,
+        "cpu_time": (usage.ru_utime - cpu.ru_utime) + (usage.ru_stime - cpu.ru_stime),
+        "elapsed": elapsed,
+        "latency_ms": statistics.median(data.latencies) * 1000 if data.latencies else None,
+    }
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark queue placement strategies on the tutorial 3 chain")
+    parser.add_argument("uri", help="URI to decode")
+    parser.add_argument("strategies", nargs="*", default=list(STRATEGIES), help="strategies to compare")
+    parser.add_argument("--max-buffers", type=int, default=8, help="queue max-size-buffers (0 = unlimited)")
+    parser.add_argument("--max-time", type=int, default=0, help="queue max-size-time in ms (0 = unlimited)")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    limits = QueueLimits(args.max_buffers, args.max_time * Gst.MSECOND, 0)
+
+    for name in args.strategies:
+        result = run_strategy(args.uri, STRATEGIES[name], limits)
+        logger.info("{0:15s} realtime {1:7.1f}x  {2:9.1f} buf/s  cpu {3:6.2f} s  latency {4}".format(
+            name, result["realtime_factor"] or 0, result["buffers_per_second"], result["cpu_time"],
+            "{0:.2f} ms".format(result["latency_ms"]) if result["latency_ms"] is not None else "-"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+import os
+import sys
+import math
+import time
+import queue
+import argparse
+import concurrent.futures
+import gi
+import logging
+import numpy
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Thumbnails and contact sheets for a set of files.
+#
+# Each file is prerolled once in PAUSED, its duration queried, and then we seek to
+# N evenly spaced timestamps, the query-duration-then-seek_simple pattern of
+# basic-tutorial-4.py. After each seek the prerolled frame is pulled from an appsink,
+# already scaled by videoscale, and copied into a tile of the contact sheet.
+#
+# Pipelines are reused between files: a pool of them is shared by the worker
+# threads, and a file only costs a new URI and a preroll, not a new graph.
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.source = None
+        self.convert = None
+        self.scale = None
+        self.filter = None
+        self.sink = None
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, data):
+    sink_pad = data.convert.get_static_pad("sink")
+    if sink_pad.is_linked():
+        return
+
+    ret = new_pad.link(sink_pad)
+    if not ret == Gst.PadLinkReturn.OK:
+        logger.error("Could not link pad '{0:s}'".format(new_pad.get_name()))
+
+class ThumbnailPipeline:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        data = self.data = CustomData()
+        data.pipeline = Gst.Pipeline.new("thumbnails")
+        data.source = Gst.ElementFactory.make("uridecodebin", "source")
+        data.convert = Gst.ElementFactory.make("videoconvert", "convert")
+        data.scale = Gst.ElementFactory.make("videoscale", "scale")
+        data.filter = Gst.ElementFactory.make("capsfilter", "filter")
+        data.sink = Gst.ElementFactory.make("appsink", "sink")
+
+        if not data.source or not data.convert or not data.scale or not data.filter or not data.sink:
+            raise RuntimeError("Not all elements could be created.")
+
+        # Only expose (and so only decode) the video stream
+        data.source.set_property("caps", Gst.Caps.from_string("video/x-raw(ANY)"))
+        data.source.set_property("expose-all-streams", False)
+
+        # Letterboxed RGB frames of the tile size
+        data.filter.set_property("caps", Gst.Caps.from_string(
+            "video/x-raw,format=RGB,width={0},height={1},pixel-aspect-ratio=1/1".format(width, height)))
+        data.sink.set_property("sync", False)
+        data.sink.set_property("max-buffers", 1)
+        data.sink.set_property("drop", True)
+
+        for element in (data.source, data.convert, data.scale, data.filter, data.sink):
+            data.pipeline.add(element)
+        data.convert.link(data.scale)
+        data.scale.link(data.filter)
+        data.filter.link(data.sink)
+
+        data.source.connect("pad-added", pad_added_handler, data)
+
+    def wait_async_done(self):
+        bus = self.data.pipeline.get_bus()
+        msg = bus.timed_pop_filtered(30 * Gst.SECOND, Gst.MessageType.ASYNC_DONE | Gst.MessageType.ERROR)
+        if msg is None:
+            raise RuntimeError("Timed out waiting for preroll.")
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+
+    # Copy the prerolled frame into `tile`
+    def pull_frame(self, tile):
+        sample = self.data.sink.emit("pull-preroll")
+        if sample is None:
+            return False
+
+        buffer = sample.get_buffer()
+        # Rows are 4-byte aligned in GStreamer's default RGB layout
+        stride = (self.width * 3 + 3) & ~3
+        with buffer.map(Gst.MapFlags.READ) as info:
+            frame = numpy.ndarray((self.height, self.width, 3), numpy.uint8, info.data, 0, (stride, 3, 1))
+            tile[:] = frame
+        return True
+
+    # Fill `tiles` (count, height, width, 3) with frames from `uri`, evenly spaced
+    def grab(self, uri, tiles, accurate=False):
+        pipeline = self.data.pipeline
+
+        # One preroll per file
+        pipeline.set_state(Gst.State.READY)
+        self.data.source.set_property("uri", uri)
+        if pipeline.set_state(Gst.State.PAUSED) == Gst.StateChangeReturn.FAILURE:
+            raise RuntimeError("Unable to set the pipeline to the paused state.")
+        self.wait_async_done()
+
+        ret, duration = pipeline.query_duration(Gst.Format.TIME)
+        if not ret:
+            raise RuntimeError("Could not query the duration of {0}.".format(uri))
+
+        flags = Gst.SeekFlags.FLUSH
+        flags |= Gst.SeekFlags.ACCURATE if accurate else Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE
+
+        count = len(tiles)
+        grabbed = 0
+        for i in range(count):
+            position = duration * (2 * i + 1) // (2 * count)
+            if not pipeline.seek_simple(Gst.Format.TIME, flags, position):
+                continue
+            self.wait_async_done()
+            if self.pull_frame(tiles[i]):
+                grabbed += 1
+
+        return grabbed
+
+    def close(self):
+        self.data.pipeline.set_state(Gst.State.NULL)
+
+class ThumbnailService:
+    def __init__(self, workers=4, width=320, height=180, columns=4):
+        self.width = width
+        self.height = height
+        self.columns = columns
+        self.pool = queue.Queue()
+        self.pipelines = []
+        for i in range(workers):
+            pipeline = ThumbnailPipeline(width, height)
+            self.pipelines.append(pipeline)
+            self.pool.put(pipeline)
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    # Returns a contact sheet (rows * height, columns * width, 3) for `uri`
+    def contact_sheet(self, uri, count=16, accurate=False):
+        rows = math.ceil(count / self.columns)
+        sheet = numpy.zeros((rows * self.height, self.columns * self.width, 3), numpy.uint8)
+        tiles = numpy.zeros((count, self.height, self.width, 3), numpy.uint8)
+
+        pipeline = self.pool.get()
+        try:
+            grabbed = pipeline.grab(uri, tiles, accurate)
+        finally:
+            self.pool.put(pipeline)
+
+        # Lay the tiles out row by row in one reshape
+        padded = numpy.zeros((rows * self.columns, self.height, self.width, 3), numpy.uint8)
+        padded[:count] = tiles
+        sheet[:] = padded.reshape(rows, self.columns, self.height, self.width, 3) \
+                         .swapaxes(1, 2).reshape(sheet.shape)
+        return sheet, grabbed
+
+    # Process `uris` concurrently; yields (uri, sheet, grabbed) as they complete
+    def run(self, uris, count=16, accurate=False):
+        futures = {self.executor.submit(self.contact_sheet, uri, count, accurate): uri for uri in uris}
+        for future in concurrent.futures.as_completed(futures):
+            uri = futures[future]
+            try:
+                sheet, grabbed = future.result()
+            except RuntimeError as err:
+                logger.error("{0}: {1}".format(uri, err))
+                continue
+            yield uri, sheet, grabbed
+
+    def close(self):
+        self.executor.shutdown()
+        for pipeline in self.pipelines:
+            pipeline.close()
+
+# Encode an RGB array to PNG with GStreamer
+def save_png(array, path):
+    height, width, channels = array.shape
+    pipeline = Gst.parse_launch(
+        "appsrc name=src caps=video/x-raw,format=RGB,width={0},height={1},framerate=0/1 ! "
+        "videoconvert ! pngenc ! filesink location={2}".format(width, height, path))
+    src = pipeline.get_by_name("src")
+
+    pipeline.set_state(Gst.State.PLAYING)
+    # One copy into a buffer with GStreamer's 4-byte aligned rows
+    stride = (width * 3 + 3) & ~3
+    rows = numpy.zeros((height, stride), numpy.uint8)
+    rows[:, :width * 3] = array.reshape(height, width * 3)
+    src.emit("push-buffer", Gst.Buffer.new_wrapped(rows.tobytes()))
+    src.emit("end-of-stream")
+
+    msg = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Could not write {0}: {1}".format(path, err.message))
+
+def main():
+    parser = argparse.ArgumentParser(description="Contact sheets for a set of files")
+    parser.add_argument("paths", nargs="+", help="media files")
+    parser.add_argument("-o", "--output-dir", default=".", help="where to write the PNG contact sheets")
+    parser.add_argument("-n", "--count", type=int, default=16, help="thumbnails per file")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="concurrent pipelines")
+    parser.add_argument("--accurate", action="store_true", help="accurate instead of keyframe seeks")
+    parser.add_argument("--size", default="320x180", help="thumbnail size")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+    width, height = (int(v) for v in args.size.split("x"))
+    service = ThumbnailService(args.workers, width, height)
+    uris = [Gst.filename_to_uri(path) for path in args.paths]
+
+    total = 0
+    start = time.perf_counter()
+    for uri, sheet, grabbed in service.run(uris, args.count, args.accurate):
+        name = os.path.splitext(os.path.basename(Gst.uri_get_location(uri)))[0]
+        save_png(sheet, os.path.join(args.output_dir, name + "-sheet.png"))
+        total += grabbed
+    elapsed = time.perf_counter() - start
+    service.close()
+
+    logger.info("{0} thumbnails from {1} files in {2:.2f} s ({3:.1f} thumbnails/s)".format(
+        total, len(uris), elapsed, total / elapsed))
+
+if __name__ == "__main__":
+    main()
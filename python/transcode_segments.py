@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import gi
+import logging
+
+gi.require_version("GLib", "2.0")
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+
+from gi.repository import Gst, GLib, GObject
+
+logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Offline transcoding of the basic-tutorial-3.py audio chain, split in time.
+#
+# The input is cut into N segments of equal length. Each segment runs in its own
+# process as uridecodebin -> audioconvert -> audioresample -> appsink (sync=false),
+# after an ACCURATE seek to the segment start with the segment end as stop
+# position. Buffers are trimmed to the exact sample range of the segment using
+# their stream time, so neighbouring segments neither overlap nor leave a gap, and
+# written as raw PCM.
+#
+# The segments are then pushed one after the other through a single
+# appsrc -> flacenc -> filesink, so the output is one lossless FLAC stream with no
+# seams. Decoding and resampling, the expensive part, run in parallel, and the
+# final pass only encodes: FLAC frames from separately encoded segments could not
+# be joined without rewriting every frame header.
+
+SAMPLE_WIDTH = 2
+OUTPUT_CAPS = "audio/x-raw,format=S16LE,layout=interleaved,rate={0},channels={1}"
+
+class CustomData:
+    def __init__(self):
+        self.pipeline = None
+        self.source = None
+        self.convert = None
+        self.resample = None
+        self.filter = None
+        self.sink = None
+
+class Encoder:
+    def __init__(self, rate, channels, path):
+        self.pipeline = Gst.Pipeline.new("encode")
+        self.source = Gst.ElementFactory.make("appsrc", "source")
+        self.encoder = Gst.ElementFactory.make("flacenc", "encoder")
+        self.sink = Gst.ElementFactory.make("filesink", "sink")
+
+        if not self.source or not self.encoder or not self.sink:
+            raise RuntimeError("Not all elements could be created.")
+
+        self.source.set_property("caps", Gst.Caps.from_string(OUTPUT_CAPS.format(rate, channels)))
+        self.source.set_property("format", Gst.Format.TIME)
+        # Block the caller instead of queueing the whole input
+        self.source.set_property("block", True)
+        self.sink.set_property("location", path)
+
+        for element in (self.source, self.encoder, self.sink):
+            self.pipeline.add(element)
+        self.source.link(self.encoder)
+        self.encoder.link(self.sink)
+
+        self.rate = rate
+        self.written = 0
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    # Append the interleaved samples `data` holding `frames` frames
+    def push(self, data, frames):
+        buffer = Gst.Buffer.new_wrapped(data)
+        buffer.pts = Gst.util_uint64_scale(self.written, Gst.SECOND, self.rate)
+        buffer.duration = Gst.util_uint64_scale(self.written + frames, Gst.SECOND, self.rate) - buffer.pts
+        self.written += frames
+        if self.source.emit("push-buffer", buffer) != Gst.FlowReturn.OK:
+            raise RuntimeError("Could not push to the encoder.")
+
+    # Finish the file
+    def close(self):
+        self.source.emit("end-of-stream")
+        try:
+            wait_for(self.pipeline.get_bus(), Gst.MessageType.EOS)
+        finally:
+            self.pipeline.set_state(Gst.State.NULL)
+
+# This function will be called by the pad-added signal
+def pad_added_handler(src, new_pad, data):
+    sink_pad = data.convert.get_static_pad("sink")
+    if sink_pad.is_linked():
+        return
+
+    if new_pad.get_current_caps().get_structure(0).get_name().startswith("audio/x-raw"):
+        new_pad.link(sink_pad)
+
+def build_pipeline(uri, rate, channels):
+    data = CustomData()
+    data.pipeline = Gst.Pipeline.new("transcode")
+    data.source = Gst.ElementFactory.make("uridecodebin", "source")
+    data.convert = Gst.ElementFactory.make("audioconvert", "convert")
+    data.resample = Gst.ElementFactory.make("audioresample", "resample")
+    data.filter = Gst.ElementFactory.make("capsfilter", "filter")
+    data.sink = Gst.ElementFactory.make("appsink", "sink")
+
+    if not data.source or not data.convert or not data.resample or not data.filter or not data.sink:
+        raise RuntimeError("Not all elements could be created.")
+
+    data.source.set_property("uri", uri)
+    data.filter.set_property("caps", Gst.Caps.from_string(OUTPUT_CAPS.format(rate, channels)))
+    data.sink.set_property("sync", False)
+    data.sink.set_property("max-buffers", 16)
+
+    for element in (data.source, data.convert, data.resample, data.filter, data.sink):
+        data.pipeline.add(element)
+    data.convert.link(data.resample)
+    data.resample.link(data.filter)
+    data.filter.link(data.sink)
+
+    data.source.connect("pad-added", pad_added_handler, data)
+    return data
+
+def wait_for(bus, types):
+    msg = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE, types | Gst.MessageType.ERROR)
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        raise RuntimeError("Error received from element {0:s}: {1:s}".format(msg.src.get_name(), err.message))
+    return msg
+
+# Query the duration of `uri` by prerolling the decode chain
+def query_duration(uri):
+    data = build_pipeline(uri, 48000, 2)
+    data.pipeline.set_state(Gst.State.PAUSED)
+    try:
+        wait_for(data.pipeline.get_bus(), Gst.MessageType.ASYNC_DONE)
+        ret, duration = data.pipeline.query_duration(Gst.Format.TIME)
+        if not ret:
+            raise RuntimeError("Could not query the duration.")
+        return duration
+    finally:
+        data.pipeline.set_state(Gst.State.NULL)
+
+# Transcode the samples [start, stop) of `uri` to raw PCM in `path`. stop is None
+# for the last segment, which runs until EOS.
+def transcode_segment(uri, start, stop, rate, channels, path):
+    Gst.init(None)
+    data = build_pipeline(uri, rate, channels)
+    bus = data.pipeline.get_bus()
+    frame_size = SAMPLE_WIDTH * channels
+
+    data.pipeline.set_state(Gst.State.PAUSED)
+    wait_for(bus, Gst.MessageType.ASYNC_DONE)
+
+    # Seek a little past the end, the trimming below is what makes the cut exact
+    stop_time = Gst.util_uint64_scale(stop, Gst.SECOND, rate) + 100 * Gst.MSECOND if stop is not None else -1
+    data.pipeline.seek(1.0, Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                       Gst.SeekType.SET, Gst.util_uint64_scale(start, Gst.SECOND, rate),
+                       Gst.SeekType.SET if stop is not None else Gst.SeekType.NONE, stop_time)
+    wait_for(bus, Gst.MessageType.ASYNC_DONE)
+    data.pipeline.set_state(Gst.State.PLAYING)
+
+    written = 0
+    with open(path, "wb") as f:
+        while True:
+            sample = data.sink.emit("try-pull-sample", 100 * Gst.MSECOND)
+            if sample is None:
+                if data.sink.get_property("eos"):
+                    break
+                if bus.pop_filtered(Gst.MessageType.ERROR):
+                    raise RuntimeError("Error while transcoding segment starting at sample {0}".format(start))
+                continue
+
+            # Without a timestamp there is no telling where the samples belong
+            buffer = sample.get_buffer()
+            if buffer.pts == Gst.CLOCK_TIME_NONE:
+                continue
+
+            # Position in the stream, which does not necessarily start at 0
+            stream_time = sample.get_segment().to_stream_time(Gst.Format.TIME, buffer.pts)
+            if stream_time == Gst.CLOCK_TIME_NONE:
+                continue
+
+            first = Gst.util_uint64_scale_round(stream_time, rate, Gst.SECOND)
+            with buffer.map(Gst.MapFlags.READ) as info:
+                frames = len(info.data) // frame_size
+                begin = max(start, first)
+                end = min(stop, first + frames) if stop is not None else first + frames
+                if end > begin:
+                    f.write(info.data[(begin - first) * frame_size:(end - first) * frame_size])
+                    written += end - begin
+
+            if stop is not None and first + frames >= stop:
+                break
+
+    data.pipeline.set_state(Gst.State.NULL)
+    return written
+
+# Encode the raw PCM segments one after the other into a single FLAC file
+def concatenate(segments, rate, channels, path):
+    frame_size = SAMPLE_WIDTH * channels
+    encoder = Encoder(rate, channels, path)
+    try:
+        for segment in segments:
+            with open(segment, "rb") as f:
+                while True:
+                    chunk = f.read(frame_size * 65536)
+                    if not chunk:
+                        break
+                    encoder.push(chunk, len(chunk) // frame_size)
+    finally:
+        encoder.close()
+
+def transcode(uri, output, segments, rate=48000, channels=2):
+    duration = query_duration(uri)
+    total = Gst.util_uint64_scale(duration, rate, Gst.SECOND)
+
+    bounds = [total * i // segments for i in range(segments + 1)]
+    workdir = tempfile.mkdtemp(prefix="transcode-")
+    paths = [os.path.join(workdir, "segment-{0:04d}.pcm".format(i)) for i in range(segments)]
+    jobs = [(uri, bounds[i], bounds[i + 1] if i < segments - 1 else None, rate, channels, paths[i])
+            for i in range(segments)]
+
+    start = time.perf_counter()
+    try:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(segments, os.cpu_count())) as pool:
+            written = pool.starmap(transcode_segment, jobs)
+
+        concatenate(paths, rate, channels, output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    realtime = duration / Gst.SECOND / elapsed
+    logger.info("{0} segments, {1} samples in {2:.2f} s, realtime factor {3:.1f}x".format(
+        segments, sum(written), elapsed, realtime))
+    return realtime
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel segmented offline transcoding to FLAC")
+    parser.add_argument("uri", help="input URI")
+    parser.add_argument("output", help="output FLAC file")
+    parser.add_argument("-n", "--segments", type=int, default=os.cpu_count(), help="number of segments")
+    parser.add_argument("--rate", type=int, default=48000, help="output sample rate")
+    parser.add_argument("--channels", type=int, default=2, help="output channels")
+    parser.add_argument("--compare", action="store_true", help="also run a single pipeline and report the speedup")
+    args = parser.parse_args()
+
+    Gst.init(sys.argv[:1])
+
+    realtime = transcode(args.uri, args.output, args.segments, args.rate, args.channels)
+
+    if args.compare:
+        single_output = args.output + ".single.flac"
+        try:
+            single = transcode(args.uri, single_output, 1, args.rate, args.channels)
+        finally:
+            if os.path.exists(single_output):
+                os.remove(single_output)
+        logger.info("Speedup over a single pipeline: {0:.2f}x".format(realtime / single))
+
+if __name__ == "__main__":
+    main()